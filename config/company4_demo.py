@@ -52,13 +52,13 @@ Tôi có thể giúp bạn trả lời các câu hỏi về tuyển sinh. Hãy 
 @cl.on_message
 async def main(message: cl.Message):
     """Handle incoming messages"""
-    message_with_context = memory_handler.get_history_message(message.content)
+    message_with_context = await memory_handler.aget_history_message(message.content)
     
     try:
         response = await agent.run(message_with_context)
-        memory_handler.store_bot_response(response.output)
+        await memory_handler.astore_bot_response(response.output)
         await cl.Message(content=str(response.output)).send()
         
     except Exception as e:
-        memory_handler.store_error(e)
+        await memory_handler.astore_error(e)
         await cl.Message(content=f"Đã có lỗi xảy ra: {str(e)}\n\nVui lòng thử lại.").send()
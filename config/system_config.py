@@ -1,4 +1,4 @@
-erom datetime import datetime
+from datetime import datetime
 from zoneinfo import ZoneInfo
 import os
 from dotenv import load_dotenv
@@ -33,8 +33,6 @@ class Settings:
         self.LOG_FORMAT: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
         self.LOG_FILE: str = "logs/chatbot.log"
 
-        self.RATE_LIMIT_PER_MINUTE: int = 60
-
     def get_current_time(self) -> datetime:
         """
         Returns the current time in the specified timezone.
@@ -0,0 +1,124 @@
+import redis.asyncio as aioredis
+
+from data.cache.redis_cache import APPEND_SCRIPT, ShortTermMemory
+from data.cache.redis_client import async_redis_pool
+
+
+class AsyncShortTermMemory(ShortTermMemory):
+    """
+    ShortTermMemory with awaitable Redis operations for async handlers.
+
+    The `a`-prefixed methods use a `redis.asyncio` connection pool so chat
+    handlers never block the event loop on Redis. The inherited sync methods
+    keep working for scripts.
+    """
+
+    def __init__(
+        self,
+        host=None,
+        port=None,
+        db=None,
+        max_messages=15,
+        l1_cache=None,
+        ttl_seconds=None,
+        max_bytes=None,
+        codec=None,
+        max_connections=50,
+        socket_timeout=2.0,
+        socket_connect_timeout=2.0,
+        health_check_interval=30,
+    ):
+        """
+        Args:
+            host, port, db: Redis location, defaulting to REDIS_HOST,
+                REDIS_PORT and REDIS_DB. Both the sync and the async client
+                authenticate with REDIS_PASSWORD.
+            max_messages: Maximum number of messages kept per session.
+            l1_cache: Optional SessionWindowCache shared with the sync API.
+            ttl_seconds, max_bytes, codec: Session idle TTL, byte cap and
+                payload compression, see ShortTermMemory.
+            max_connections: Size of the async connection pool.
+            socket_timeout: Seconds to wait for a Redis reply.
+            socket_connect_timeout: Seconds to wait for a new connection.
+            health_check_interval: Idle seconds after which a pooled
+                connection is PINGed before reuse.
+        """
+        super().__init__(
+            host=host,
+            port=port,
+            db=db,
+            max_messages=max_messages,
+            l1_cache=l1_cache,
+            ttl_seconds=ttl_seconds,
+            max_bytes=max_bytes,
+            codec=codec,
+        )
+        self.pool = async_redis_pool(
+            host,
+            port,
+            db,
+            max_connections=max_connections,
+            socket_timeout=socket_timeout,
+            socket_connect_timeout=socket_connect_timeout,
+            health_check_interval=health_check_interval,
+            retry_on_timeout=True,
+        )
+        self.async_client = aioredis.Redis(connection_pool=self.pool)
+        self._async_append_script = self.async_client.register_script(APPEND_SCRIPT)
+
+    async def astore(self, key: str, message: str):
+        """Store a message, keeping only the latest 'max_messages' messages."""
+        cached = self._cached_window(key)
+        keys, args = self._append_args(key, message, fetch=False)
+        result = await self._async_append_script(keys=keys, args=args)
+        self._finish_store(key, message, result, cached)
+        print(f"Stored message for key: {key}. Total messages: {result[1]}")
+
+    async def aappend_and_fetch(self, key: str, message: str):
+        """Store a message and return the messages stored before it, newest first."""
+        cached = self._cached_window(key)
+        keys, args = self._append_args(key, message, fetch=cached is None)
+        result = await self._async_append_script(keys=keys, args=args)
+        previous = self._finish_append(key, message, result, cached)
+        if previous is None:
+            previous = (await self.aretrieve(key))[1:]
+        return previous
+
+    async def aretrieve(self, key: str):
+        """Retrieve all messages for a session (key), newest first."""
+        cached = self._cached_window(key)
+        if cached is not None:
+            version = await self.async_client.get(self.version_key(key))
+            if version is not None and int(version) == cached.version:
+                self.l1_cache.record_hit()
+                return list(cached.messages)
+            self.l1_cache.invalidate(key, stale=True)
+
+        pipe = self.async_client.pipeline()
+        pipe.lrange(key, 0, -1)
+        pipe.get(self.version_key(key))
+        messages, version = await pipe.execute()
+        messages = [self.codec.decode(msg) for msg in messages]
+        if self.l1_cache is not None and version is not None:
+            self.l1_cache.put(key, int(version), messages)
+        return messages
+
+    async def adelete(self, key: str):
+        """Delete all messages for a given key."""
+        await self.async_client.delete(
+            key, self.version_key(key), self.touched_key(key)
+        )
+        if self.l1_cache is not None:
+            self.l1_cache.invalidate(key)
+
+    async def ahealth_check(self) -> bool:
+        """Return True if Redis answers a PING."""
+        try:
+            return bool(await self.async_client.ping())
+        except aioredis.RedisError as e:
+            print(f"Redis health check failed: {e}")
+            return False
+
+    async def aclose(self):
+        """Close the async connection pool."""
+        await self.async_client.aclose()
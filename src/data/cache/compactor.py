@@ -0,0 +1,246 @@
+"""
+Background compaction of idle Redis conversation sessions.
+
+Sessions that have been idle for a while are shrunk: their older messages
+are replaced with a single summary record (`MessageRecord.summary`) and only
+the most recent messages are kept verbatim. The replacement is done under
+WATCH on the session version counter, so a session that receives a message
+while it is being summarized is left alone until the next pass; bumping the
+version also invalidates any L1 window other workers hold for it.
+
+Idle time is measured from the last-write time APPEND_SCRIPT records with each
+session. Only one worker compacts at a time: each pass is taken by whoever
+holds a `RedisLock`, which expires after `interval_seconds`.
+"""
+
+import asyncio
+import inspect
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional, Union
+
+import redis
+
+from data.cache.distributed_lock import RedisLock
+from data.cache.message_record import MessageRecord
+from data.cache.redis_cache import ShortTermMemory
+from data.cache.redis_client import async_redis_like
+
+logger = logging.getLogger(__name__)
+
+Summarizer = Callable[[List[MessageRecord]], Union[str, Awaitable[str]]]
+
+
+def extractive_summary(records: List[MessageRecord], max_chars: int = 1500) -> str:
+    """Summarize records by keeping the start of each message, oldest first."""
+    lines = []
+    for record in records:
+        if record.summary:
+            lines.append(record.content)
+        else:
+            content = " ".join(record.content.split())
+            lines.append(f"{record.role}: {content[:200]}")
+    summary = "\n".join(lines)
+    if len(summary) > max_chars:
+        # Older lines go first when the summary overflows
+        summary = "…" + summary[-max_chars:]
+    return summary
+
+
+def agent_summarizer(agent, max_chars: int = 1500) -> Summarizer:
+    """Build a summarizer that asks a pydantic-ai agent to condense the history."""
+
+    async def summarize(records: List[MessageRecord]) -> str:
+        transcript = "\n".join(record.render() for record in records)
+        result = await agent.run(
+            "Summarize this conversation between a student and the study "
+            f"assistant in at most {max_chars} characters. Keep subjects, "
+            f"deadlines and schedule decisions.\n\n{transcript}"
+        )
+        return str(result.output)[:max_chars]
+
+    return summarize
+
+
+class SessionCompactor:
+    """Periodically summarizes and shrinks idle sessions of a ShortTermMemory"""
+
+    def __init__(
+        self,
+        memory: ShortTermMemory,
+        keep_recent: int = 6,
+        min_idle_seconds: int = 1800,
+        interval_seconds: int = 600,
+        summarize: Optional[Summarizer] = None,
+        long_term_memory=None,
+        lock: Optional[RedisLock] = None,
+    ):
+        """
+        Args:
+            memory: Redis memory whose sessions are compacted.
+            keep_recent: Messages kept verbatim in a compacted session.
+            min_idle_seconds: Only sessions idle this long are compacted.
+            interval_seconds: Pause between compaction passes.
+            summarize: Turns the older records (oldest first) into summary
+                text. Defaults to `extractive_summary`; see `agent_summarizer`.
+            long_term_memory: Optional StudentMemoryStore that also receives
+                the summary when the session is linked to a student.
+            lock: Lock deciding which worker runs a pass, defaulting to
+                `session_compactor:lock` on the memory's Redis server.
+        """
+        self.memory = memory
+        self.keep_recent = keep_recent
+        self.min_idle_seconds = min_idle_seconds
+        self.interval_seconds = interval_seconds
+        self.summarize = summarize or extractive_summary
+        self.long_term_memory = long_term_memory
+        self.lock = lock or RedisLock(
+            # Same server and credentials as the sessions it guards
+            getattr(memory, "async_client", None)
+            or async_redis_like(memory.redis_client),
+            "session_compactor:lock",
+            ttl_ms=interval_seconds * 1000,
+        )
+        self._task: Optional[asyncio.Task] = None
+        self.metrics = {
+            "passes": 0,
+            "passes_skipped": 0,
+            "compacted": 0,
+            "messages_removed": 0,
+            "bytes_saved": 0,
+            "conflicts": 0,
+        }
+
+    def _idle_seconds(self, key: str) -> Optional[float]:
+        """Seconds since the last message of a session, None if unknown"""
+        touched = self.memory.redis_client.get(self.memory.touched_key(key))
+        if touched is not None:
+            return time.time() - float(touched)
+        # Sessions written before last-write times were recorded: every write
+        # refreshes the TTL, so elapsed TTL is the idle time
+        if self.memory.ttl_seconds <= 0:
+            return None
+        remaining = self.memory.redis_client.ttl(key)
+        if remaining is None or remaining < 0:
+            return None
+        return self.memory.ttl_seconds - remaining
+
+    async def compact_session(self, key: str) -> bool:
+        """Compact one session if it is idle and long enough; True if compacted."""
+        client = self.memory.redis_client
+        idle = await asyncio.to_thread(self._idle_seconds, key)
+        # A session whose idle time is unknown may be in use right now
+        if idle is None or idle < self.min_idle_seconds:
+            return False
+
+        pipe = client.pipeline()
+        pipe.lrange(key, 0, -1)
+        pipe.get(self.memory.version_key(key))
+        raw, version = await asyncio.to_thread(pipe.execute)
+        if len(raw) <= self.keep_recent + 1:
+            return False
+
+        codec = self.memory.codec
+        older = [
+            MessageRecord.decode(codec.decode(item)) for item in raw[self.keep_recent :]
+        ]
+        older.reverse()  # chronological order for the summarizer
+        summary = self.summarize(older)
+        if inspect.isawaitable(summary):
+            summary = await summary
+        record = MessageRecord.create("Summary", summary, summary=True)
+        record.ts = older[-1].ts
+        encoded = codec.encode(record.encode())
+
+        replaced = await asyncio.to_thread(self._replace_older, key, version, encoded)
+        if not replaced:
+            self.metrics["conflicts"] += 1
+            return False
+        if self.long_term_memory is not None:
+            await asyncio.to_thread(self._remember_summary, key, summary)
+        self.metrics["compacted"] += 1
+        self.metrics["messages_removed"] += len(older) - 1
+        removed_bytes = sum(len(item) for item in raw[self.keep_recent :])
+        self.metrics["bytes_saved"] += removed_bytes - len(encoded)
+        return True
+
+    def _replace_older(self, key: str, version, encoded: bytes) -> bool:
+        """Swap everything after the recent messages for the summary record"""
+        version_key = self.memory.version_key(key)
+        with self.memory.redis_client.pipeline() as pipe:
+            try:
+                pipe.watch(version_key)
+                if pipe.get(version_key) != version:
+                    return False
+                pipe.multi()
+                pipe.ltrim(key, 0, self.keep_recent - 1)
+                pipe.rpush(key, encoded)
+                pipe.incr(version_key)
+                if self.memory.ttl_seconds > 0:
+                    pipe.expire(key, self.memory.ttl_seconds)
+                    pipe.expire(version_key, self.memory.ttl_seconds)
+                    pipe.expire(self.memory.touched_key(key), self.memory.ttl_seconds)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def _remember_summary(self, key: str, summary: str):
+        student_id = self.long_term_memory.student_for_session(key)
+        if student_id:
+            self.long_term_memory.remember(student_id, summary, kind="summary")
+
+    async def compact_once(self, max_seconds: Optional[float] = None) -> int:
+        """
+        Run one pass over all sessions and return how many were compacted.
+
+        Args:
+            max_seconds: Stop the pass after this long; the remaining
+                sessions are left for the next pass.
+        """
+        started = time.monotonic()
+        keys = await asyncio.to_thread(lambda: list(self.memory.session_keys()))
+        compacted = 0
+        for key in keys:
+            if max_seconds is not None and time.monotonic() - started > max_seconds:
+                logger.info("Compaction pass reached its time limit")
+                break
+            try:
+                compacted += await self.compact_session(key)
+            except Exception as e:
+                logger.warning(f"Compaction of {key} failed: {e}")
+        self.metrics["passes"] += 1
+        logger.info(
+            f"Compacted {compacted}/{len(keys)} sessions "
+            f"in {time.monotonic() - started:.1f}s"
+        )
+        return compacted
+
+    async def run_forever(self):
+        while True:
+            try:
+                # The lock is left to expire, so whichever worker takes it
+                # next starts the following pass about an interval later
+                if await self.lock.acquire():
+                    # Finish before the lock expires and another worker starts
+                    await self.compact_once(max_seconds=self.interval_seconds)
+                else:
+                    self.metrics["passes_skipped"] += 1
+            except redis.RedisError as e:
+                logger.warning(f"Session compaction pass failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> asyncio.Task:
+        """Start the background loop on the running event loop (idempotent)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run_forever())
+        return self._task
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self):
+        """Return compaction counters together with the memory metrics."""
+        return {**self.metrics, **self.memory.memory_stats()}
@@ -0,0 +1,141 @@
+"""
+Transparent compression of stored conversation payloads.
+
+Every payload written by `ShortTermMemory` starts with a header byte naming
+its encoding, so readers never need to know how it was written:
+
+- `\\x00`: raw UTF-8
+- `\\x01`: zlib
+- `\\x02`: zstd (only written when the `zstandard` package is installed)
+
+Payloads without a header (written before compression existed) are read as
+raw UTF-8; JSON records and legacy `[HH:MM]` strings never start with one of
+the header bytes.
+"""
+
+import os
+import threading
+import zlib
+from typing import Dict, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+RAW = b"\x00"
+ZLIB = b"\x01"
+ZSTD = b"\x02"
+
+
+class PayloadCodec:
+    """Compresses payloads above a size threshold and tracks the savings"""
+
+    def __init__(
+        self,
+        threshold: Optional[int] = None,
+        algorithm: Optional[str] = None,
+        level: int = 6,
+    ):
+        """
+        Args:
+            threshold: Payloads of at least this many UTF-8 bytes are
+                compressed. Defaults to MEMORY_COMPRESSION_THRESHOLD (1024);
+                0 disables compression.
+            algorithm: "zstd", "zlib" or "auto" (zstd when installed),
+                defaulting to MEMORY_COMPRESSION.
+            level: Compression level.
+        """
+        self.threshold = (
+            threshold
+            if threshold is not None
+            else int(os.getenv("MEMORY_COMPRESSION_THRESHOLD", 1024))
+        )
+        algorithm = (algorithm or os.getenv("MEMORY_COMPRESSION", "auto")).lower()
+        if algorithm == "auto":
+            algorithm = "zstd" if zstandard is not None else "zlib"
+        if algorithm == "zstd" and zstandard is None:
+            print("zstandard is not installed, falling back to zlib")
+            algorithm = "zlib"
+        self.algorithm = algorithm
+        self.level = level
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.metrics = {
+            "written": 0,
+            "compressed": 0,
+            "raw_bytes_written": 0,
+            "stored_bytes_written": 0,
+            "stored_bytes_read": 0,
+        }
+
+    def _zstd(self):
+        # zstd contexts are not thread-safe, keep one pair per thread
+        if not hasattr(self._local, "compressor"):
+            self._local.compressor = zstandard.ZstdCompressor(level=self.level)
+            self._local.decompressor = zstandard.ZstdDecompressor()
+        return self._local.compressor, self._local.decompressor
+
+    def encode(self, text: str) -> bytes:
+        """Encode `text` for storage, compressing it if it is large enough."""
+        raw = text.encode("utf-8")
+        payload = RAW + raw
+        if self.threshold and len(raw) >= self.threshold:
+            if self.algorithm == "zstd":
+                compressed = ZSTD + self._zstd()[0].compress(raw)
+            else:
+                compressed = ZLIB + zlib.compress(raw, self.level)
+            # Already-dense text can grow; keep whichever is smaller
+            if len(compressed) < len(payload):
+                payload = compressed
+        with self._lock:
+            self.metrics["written"] += 1
+            self.metrics["compressed"] += payload[:1] != RAW
+            self.metrics["raw_bytes_written"] += len(raw)
+            self.metrics["stored_bytes_written"] += len(payload)
+        return payload
+
+    def decode(self, payload: bytes) -> str:
+        """Decode a stored payload written by `encode` (or by older versions)."""
+        with self._lock:
+            self.metrics["stored_bytes_read"] += len(payload)
+        header, body = payload[:1], payload[1:]
+        if header == RAW:
+            return body.decode("utf-8")
+        if header == ZLIB:
+            return zlib.decompress(body).decode("utf-8")
+        if header == ZSTD:
+            if zstandard is None:
+                raise RuntimeError("zstd-compressed payload but zstandard is missing")
+            return self._zstd()[1].decompress(body).decode("utf-8")
+        return payload.decode("utf-8")
+
+    def stats(self) -> Dict[str, float]:
+        """Return byte counters and the compression ratio of written payloads."""
+        with self._lock:
+            stats = dict(self.metrics)
+        stored = stats["stored_bytes_written"]
+        stats["ratio"] = stats["raw_bytes_written"] / stored if stored else 1.0
+        stats["bytes_saved"] = stats["raw_bytes_written"] - stored
+        stats["algorithm"] = self.algorithm
+        stats["threshold"] = self.threshold
+        return stats
+
+
+if __name__ == "__main__":
+    # Size of a typical weekly schedule reply with and without compression
+    day = (
+        "| 07:30 - 09:00 | Toán cao cấp | Ôn tập chương 3, làm bài tập 1-10 |\n"
+        "| 09:15 - 10:45 | Vật lý đại cương | Đọc trước bài Điện từ trường |\n"
+        "| 14:00 - 15:30 | Tiếng Anh | Luyện nghe IELTS Part 2 |\n"
+    )
+    schedule = "".join(f"### Thứ {n}\n{day}" for n in range(2, 9))
+    for algorithm in ("zlib", "zstd"):
+        codec = PayloadCodec(threshold=1024, algorithm=algorithm)
+        payload = codec.encode(schedule)
+        assert codec.decode(payload) == schedule
+        stats = codec.stats()
+        print(
+            f"{codec.algorithm:>5}: {stats['raw_bytes_written']} -> "
+            f"{stats['stored_bytes_written']} bytes (ratio {stats['ratio']:.2f})"
+        )
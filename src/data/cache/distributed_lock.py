@@ -0,0 +1,123 @@
+"""
+Redis locks and once-per-week flags shared by every worker.
+
+`RedisLock` is a single-instance Redis lock: SET NX PX with a random token,
+released by a Lua script that only deletes the key if it still holds our
+token, so a worker whose lock expired can never release someone else's.
+
+`WeeklyReportGuard` combines such a lock with a per-student, per-ISO-week
+flag so the weekend report is generated and emailed exactly once per week,
+whatever the number of tabs or workers a student's messages land on.
+"""
+
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Optional
+
+import redis.asyncio as aioredis
+
+from data.cache.redis_client import async_redis
+
+# KEYS[1]: lock key. ARGV[1]: owner token.
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLock:
+    """Non-reentrant lock held in Redis with an expiry"""
+
+    def __init__(self, client: aioredis.Redis, key: str, ttl_ms: int = 300_000):
+        """
+        Args:
+            client: asyncio Redis client.
+            key: Lock key.
+            ttl_ms: Milliseconds after which the lock frees itself if the
+                holder dies; must exceed the work done under the lock.
+        """
+        self.client = client
+        self.key = key
+        self.ttl_ms = ttl_ms
+        self.token: Optional[str] = None
+        self._release = client.register_script(RELEASE_SCRIPT)
+
+    async def acquire(self) -> bool:
+        """Try once to take the lock. Returns True if we now hold it."""
+        token = uuid.uuid4().hex
+        if await self.client.set(self.key, token, nx=True, px=self.ttl_ms):
+            self.token = token
+            return True
+        return False
+
+    async def release(self) -> bool:
+        """Release the lock if we still hold it."""
+        if self.token is None:
+            return False
+        released = await self._release(keys=[self.key], args=[self.token])
+        self.token = None
+        return bool(released)
+
+
+class WeeklyReportGuard:
+    """Ensures a report is produced at most once per student and ISO week"""
+
+    def __init__(
+        self,
+        client: Optional[aioredis.Redis] = None,
+        key_prefix: str = "weekly_report",
+        lock_ttl_ms: int = 300_000,
+    ):
+        """
+        Args:
+            client: asyncio Redis client, defaulting to the REDIS_* settings.
+            key_prefix: Prefix of the flag and lock keys.
+            lock_ttl_ms: Lock expiry; generating and sending a report must
+                finish within it.
+        """
+        self.client = client or async_redis()
+        self.key_prefix = key_prefix
+        self.lock_ttl_ms = lock_ttl_ms
+
+    @staticmethod
+    def iso_week(day: Optional[datetime] = None) -> str:
+        """ISO week label such as 2025-W29."""
+        year, week, _ = (day or datetime.now()).isocalendar()
+        return f"{year}-W{week:02d}"
+
+    def _flag_key(self, student_id: str, week: str) -> str:
+        return f"{self.key_prefix}:{student_id}:{week}:sent"
+
+    async def already_sent(self, student_id: str, week: str) -> bool:
+        return bool(await self.client.exists(self._flag_key(student_id, week)))
+
+    async def mark_sent(self, student_id: str, week: str):
+        # Keep the flag a little longer than the week it covers
+        await self.client.set(self._flag_key(student_id, week), 1, ex=8 * 24 * 3600)
+
+    @asynccontextmanager
+    async def claim(self, student_id: str, week: str):
+        """
+        Yield True if the caller should produce this week's report.
+
+        The caller holds the lock for the duration of the block and must call
+        `mark_sent` once the report went out. Yields False if the report was
+        already sent or another worker is producing it right now.
+        """
+        if await self.already_sent(student_id, week):
+            yield False
+            return
+        lock = RedisLock(
+            self.client, f"{self.key_prefix}:{student_id}:{week}:lock", self.lock_ttl_ms
+        )
+        if not await lock.acquire():
+            yield False
+            return
+        try:
+            # The holder before us may have finished between the two checks
+            yield not await self.already_sent(student_id, week)
+        finally:
+            await lock.release()
@@ -0,0 +1,227 @@
+"""
+Long-term memory per student.
+
+Short-term memory only keeps the last messages of one Chainlit session, so a
+returning student has to repeat their student ID, subject combination and
+study hours. `StudentMemoryStore` keeps embedded facts and conversation
+summaries in Redis, keyed by student ID, and returns the items most similar
+to the current question at the start of a turn.
+
+Each student has two hashes: `<prefix>:<student_id>` maps item IDs to JSON
+metadata and `<prefix>:<student_id>:vectors` maps them to normalized float32
+embeddings. A student rarely has more than a few hundred items, so similarity
+is computed in process with numpy after a single HGETALL round trip.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional, Tuple
+
+import numpy as np
+import redis
+
+from data.cache.redis_client import sync_redis
+
+STUDENT_ID_PATTERN = re.compile(r"(?<!\d)(\d{8})(?!\d)")
+
+
+def extract_student_id(text: str) -> Optional[str]:
+    """Return the first 8-digit student ID mentioned in `text`, if any."""
+    match = STUDENT_ID_PATTERN.search(text or "")
+    return match.group(1) if match else None
+
+
+@dataclass
+class MemoryItem:
+    """A fact or conversation summary remembered about a student."""
+
+    text: str
+    kind: str = "fact"
+    item_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    created_at: float = field(default_factory=time.time)
+
+
+class StudentMemoryStore:
+    """Embedded facts and summaries per student, retrieved by similarity"""
+
+    def __init__(
+        self,
+        embedding_engine=None,
+        redis_client: Optional[redis.Redis] = None,
+        max_items: int = 200,
+        min_score: float = 0.35,
+        dedupe_threshold: float = 0.95,
+        ttl_seconds: Optional[int] = None,
+        key_prefix: str = "ltm",
+    ):
+        """
+        Initialize the store.
+
+        Args:
+            embedding_engine: EmbeddingEngine used to embed items and queries.
+                Created lazily with the default model when omitted.
+            redis_client: Redis client, defaulting to the REDIS_* settings.
+            max_items: Items kept per student; the oldest are dropped first.
+            min_score: Minimum cosine similarity for an item to be recalled.
+            dedupe_threshold: A new item this similar to an existing one
+                replaces it instead of being added.
+            ttl_seconds: Seconds a student's memory survives without new
+                items, defaulting to LONG_TERM_MEMORY_TTL_SECONDS (180 days).
+            key_prefix: Prefix of the Redis keys.
+        """
+        self._embedding_engine = embedding_engine
+        self.redis_client = redis_client or sync_redis()
+        self.max_items = max_items
+        self.min_score = min_score
+        self.dedupe_threshold = dedupe_threshold
+        self.ttl_seconds = (
+            ttl_seconds
+            if ttl_seconds is not None
+            else int(os.getenv("LONG_TERM_MEMORY_TTL_SECONDS", 180 * 24 * 3600))
+        )
+        self.key_prefix = key_prefix
+        self._lock = threading.Lock()
+        self.metrics = {"remembered": 0, "deduplicated": 0, "recalls": 0, "recalled": 0}
+
+    @property
+    def embedding_engine(self):
+        if self._embedding_engine is None:
+            from data.embeddings.embedding_engine import get_engine
+
+            self._embedding_engine = get_engine()
+        return self._embedding_engine
+
+    def _keys(self, student_id: str) -> Tuple[str, str]:
+        key = f"{self.key_prefix}:{student_id}"
+        return key, f"{key}:vectors"
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        vector = np.asarray(
+            self.embedding_engine.get_query_embedding(text.strip()), dtype=np.float32
+        )
+        norm = np.linalg.norm(vector)
+        if vector.size == 0 or norm == 0:
+            return None
+        return vector / norm
+
+    def _load(self, student_id: str):
+        """Return the student's items and their embeddings as a matrix"""
+        key, vectors_key = self._keys(student_id)
+        pipe = self.redis_client.pipeline()
+        pipe.hgetall(key)
+        pipe.hgetall(vectors_key)
+        raw_items, raw_vectors = pipe.execute()
+
+        items, rows = [], []
+        for item_id, data in raw_items.items():
+            vector = raw_vectors.get(item_id)
+            if vector is None:
+                continue
+            items.append(MemoryItem(**json.loads(data)))
+            rows.append(np.frombuffer(vector, dtype=np.float32))
+        matrix = np.vstack(rows) if rows else np.empty((0, 0), dtype=np.float32)
+        return items, matrix
+
+    def remember(self, student_id: str, text: str, kind: str = "fact") -> Optional[str]:
+        """
+        Embed and store `text` for a student.
+
+        Returns:
+            The item ID, or None if the text could not be embedded.
+        """
+        text = text.strip()
+        if not student_id or not text:
+            return None
+        vector = self._embed(text)
+        if vector is None:
+            return None
+
+        key, vectors_key = self._keys(student_id)
+        with self._lock:
+            items, matrix = self._load(student_id)
+            duplicates = []
+            if items and matrix.shape[1] == vector.shape[0]:
+                scores = matrix @ vector
+                duplicates = [
+                    item.item_id
+                    for item, score in zip(items, scores)
+                    if item.kind == kind and score >= self.dedupe_threshold
+                ]
+            keep = [item for item in items if item.item_id not in duplicates]
+            # Drop the oldest items beyond the cap (leaving room for the new one)
+            keep.sort(key=lambda item: item.created_at)
+            overflow = max(0, len(keep) - self.max_items + 1)
+            stale = duplicates + [item.item_id for item in keep[:overflow]]
+
+            item = MemoryItem(text=text, kind=kind)
+            pipe = self.redis_client.pipeline()
+            if stale:
+                pipe.hdel(key, *stale)
+                pipe.hdel(vectors_key, *stale)
+            pipe.hset(key, item.item_id, json.dumps(asdict(item), ensure_ascii=False))
+            pipe.hset(vectors_key, item.item_id, vector.tobytes())
+            if self.ttl_seconds > 0:
+                pipe.expire(key, self.ttl_seconds)
+                pipe.expire(vectors_key, self.ttl_seconds)
+            pipe.execute()
+        self.metrics["remembered"] += 1
+        self.metrics["deduplicated"] += len(duplicates)
+        return item.item_id
+
+    def recall(
+        self, student_id: str, query: str, k: int = 4
+    ) -> List[Tuple[MemoryItem, float]]:
+        """Return up to `k` (item, similarity) pairs relevant to `query`, best first."""
+        if not student_id:
+            return []
+        self.metrics["recalls"] += 1
+        items, matrix = self._load(student_id)
+        vector = self._embed(query) if query.strip() else None
+        if not items or vector is None or matrix.shape[1] != vector.shape[0]:
+            return []
+        scores = matrix @ vector
+        ranked = sorted(zip(items, scores.tolist()), key=lambda pair: -pair[1])
+        recalled = [(item, score) for item, score in ranked if score >= self.min_score]
+        self.metrics["recalled"] += len(recalled[:k])
+        return recalled[:k]
+
+    def items(self, student_id: str) -> List[MemoryItem]:
+        """Return every item remembered about a student, oldest first."""
+        items, _ = self._load(student_id)
+        return sorted(items, key=lambda item: item.created_at)
+
+    def forget(self, student_id: str):
+        """Delete everything remembered about a student."""
+        self.redis_client.delete(*self._keys(student_id))
+
+    def link_session(self, session_key: str, student_id: str):
+        """Record which student a short-term memory session belongs to."""
+        self.redis_client.set(
+            f"{self.key_prefix}:session:{session_key}",
+            student_id,
+            ex=self.ttl_seconds or None,
+        )
+
+    def student_for_session(self, session_key: str) -> Optional[str]:
+        student_id = self.redis_client.get(f"{self.key_prefix}:session:{session_key}")
+        return student_id.decode("utf-8") if student_id else None
+
+    @staticmethod
+    def format_context(student_id: str, recalled) -> str:
+        """Build the long-term memory block placed before the conversation history"""
+        if not student_id:
+            return ""
+        context = "\n=== STUDENT MEMORY ===\n"
+        context += f"Student ID: {student_id}\n"
+        for item, _ in recalled:
+            label = "Summary" if item.kind == "summary" else "Fact"
+            context += f"- {label}: {item.text}\n"
+        return context + "=== END STUDENT MEMORY ===\n"
+
+    def stats(self):
+        return dict(self.metrics)
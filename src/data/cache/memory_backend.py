@@ -0,0 +1,375 @@
+"""
+Storage backends for short-term conversation memory.
+
+`MemoryBackend` holds the session-level logic (history context, message
+records, Chainlit session keys) on top of four storage primitives: `store`,
+`append_and_fetch`, `retrieve` and `delete`, each with an awaitable
+`a`-prefixed twin. Implementations:
+
+- `InProcessMemoryBackend`: lock-protected deques, for single-node runs and
+  local development.
+- `SQLiteMemoryBackend`: a SQLite file in WAL mode, survives restarts
+  without a Redis server.
+- `data.cache.redis_cache.ShortTermMemory` / `AsyncShortTermMemory`: Redis,
+  shared by every worker.
+
+`create_memory_backend` picks one from the MEMORY_BACKEND environment
+variable (`redis`, `inprocess` or `sqlite`).
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import uuid
+from collections import deque
+from datetime import datetime
+
+import chainlit as cl
+
+from data.cache.message_record import MessageRecord, select_window
+
+
+class MemoryBackend:
+    """Session memory on top of a list-per-session storage backend"""
+
+    def __init__(self, max_messages=15):
+        self.max_messages = max_messages  # Maximum number of messages to store
+
+    def store(self, key: str, message: str):
+        """Append a message, keeping only the latest 'max_messages' messages."""
+        raise NotImplementedError
+
+    def append_and_fetch(self, key: str, message: str):
+        """Append a message and return the messages stored before it, newest first."""
+        raise NotImplementedError
+
+    def retrieve(self, key: str):
+        """Return all messages stored for a session, newest first."""
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        """Delete all messages for a given key."""
+        raise NotImplementedError
+
+    # Backends doing blocking I/O run the sync primitives on a worker thread;
+    # backends with native async clients override these
+    async def astore(self, key: str, message: str):
+        await asyncio.to_thread(self.store, key, message)
+
+    async def aappend_and_fetch(self, key: str, message: str):
+        return await asyncio.to_thread(self.append_and_fetch, key, message)
+
+    async def aretrieve(self, key: str):
+        return await asyncio.to_thread(self.retrieve, key)
+
+    async def adelete(self, key: str):
+        await asyncio.to_thread(self.delete, key)
+
+    def get_session_key(self):
+        """Get or create session key"""
+        session_key = cl.user_session.get("session_key")
+        if not session_key:
+            session_key = (
+                f"user_{str(uuid.uuid4())[:8]}_{datetime.now().strftime('%Y%m%d_%H%M')}"
+            )
+            cl.user_session.set("session_key", session_key)
+        return session_key
+
+    def get_history_context(self, session_key, token_budget=None, roles=None):
+        """Build conversation history context"""
+        return self.format_history_context(
+            self.retrieve(session_key), token_budget=token_budget, roles=roles
+        )
+
+    def retrieve_records(self, key: str, token_budget=None, roles=None):
+        """
+        Retrieve the stored messages of a session as MessageRecords.
+
+        Args:
+            key: Session key.
+            token_budget: Keep only the most recent records fitting this
+                many tokens.
+            roles: Keep only records with one of these roles.
+
+        Returns:
+            List of MessageRecord, newest first.
+        """
+        records = [MessageRecord.decode(raw) for raw in self.retrieve(key)]
+        return select_window(records, token_budget=token_budget, roles=roles)
+
+    def format_history_context(
+        self, history, max_messages=8, token_budget=None, roles=None
+    ):
+        """
+        Build conversation history context from messages stored newest first
+
+        Args:
+            history: Stored messages (encoded records or legacy strings).
+            max_messages: Maximum number of messages to show.
+            token_budget: Maximum total tokens of the messages shown, using
+                the counts stored with each record.
+            roles: Only show messages with one of these roles.
+        """
+        if len(history) == 0:
+            return ""
+
+        records = [MessageRecord.decode(raw) for raw in history]
+        window = select_window(
+            records, token_budget=token_budget, roles=roles, max_messages=max_messages
+        )
+        if not window:
+            return ""
+
+        # Redis LPUSH puts newest first, so reverse to get chronological order
+        recent = [record.render() for record in reversed(window)]
+        context = "\n=== CONVERSATION HISTORY ===\n"
+        if len(window) < len(records):
+            context += f"[Showing last {len(window)} messages]\n"
+
+        return context + "\n".join(recent) + "\n=== END HISTORY ===\n\n"
+
+    @staticmethod
+    def format_message(role, content, summary=False):
+        """Encode a message as a timestamped record with its token count"""
+        return MessageRecord.create(role, content, summary=summary).encode()
+
+    def store_message(self, session_key, role, content):
+        """Store a message with timestamp"""
+        self.store(session_key, self.format_message(role, content))
+
+    def store_user_message_with_context(self, session_key, content):
+        """Store user message and return the history context that preceded it"""
+        history = self.append_and_fetch(
+            session_key, self.format_message("User", content)
+        )
+        return self.format_history_context(history)
+
+    def store_user_message(self, session_key, content):
+        """Store user message"""
+        self.store_message(session_key, "User", content)
+
+    def store_bot_message(self, session_key, content):
+        """Store bot message"""
+        self.store_message(session_key, "Bot", content)
+
+    def store_error_message(self, session_key, error):
+        """Store error message"""
+        self.store_message(session_key, "System", f"Error - {str(error)}")
+
+    def update_message_count(self):
+        """Update and return message count"""
+        count = (cl.user_session.get("message_count") or 0) + 1
+        cl.user_session.set("message_count", count)
+        return count
+
+    async def aget_history_context(self, session_key, token_budget=None, roles=None):
+        """Build conversation history context"""
+        return self.format_history_context(
+            await self.aretrieve(session_key), token_budget=token_budget, roles=roles
+        )
+
+    async def aretrieve_records(self, key: str, token_budget=None, roles=None):
+        """Retrieve the stored messages of a session as MessageRecords, newest first"""
+        records = [MessageRecord.decode(raw) for raw in await self.aretrieve(key)]
+        return select_window(records, token_budget=token_budget, roles=roles)
+
+    async def astore_message(self, session_key, role, content):
+        """Store a message with timestamp"""
+        await self.astore(session_key, self.format_message(role, content))
+
+    async def astore_user_message_with_context(self, session_key, content):
+        """Store user message and return the history context that preceded it"""
+        history = await self.aappend_and_fetch(
+            session_key, self.format_message("User", content)
+        )
+        return self.format_history_context(history)
+
+
+class InProcessMemoryBackend(MemoryBackend):
+    """Conversation memory kept in this process, in a deque per session"""
+
+    def __init__(self, max_messages=15):
+        super().__init__(max_messages=max_messages)
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _session(self, key: str):
+        session = self._sessions.get(key)
+        if session is None:
+            session = self._sessions[key] = deque(maxlen=self.max_messages)
+        return session
+
+    def store(self, key: str, message: str):
+        with self._lock:
+            self._session(key).appendleft(message)
+
+    def append_and_fetch(self, key: str, message: str):
+        with self._lock:
+            session = self._session(key)
+            previous = list(session)
+            session.appendleft(message)
+        return previous
+
+    def retrieve(self, key: str):
+        with self._lock:
+            return list(self._sessions.get(key, ()))
+
+    def delete(self, key: str):
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    # Nothing here blocks, so skip the thread hop
+    async def astore(self, key: str, message: str):
+        self.store(key, message)
+
+    async def aappend_and_fetch(self, key: str, message: str):
+        return self.append_and_fetch(key, message)
+
+    async def aretrieve(self, key: str):
+        return self.retrieve(key)
+
+    async def adelete(self, key: str):
+        self.delete(key)
+
+
+class SQLiteMemoryBackend(MemoryBackend):
+    """Conversation memory in a local SQLite database in WAL mode"""
+
+    def __init__(self, path=None, max_messages=15):
+        """
+        Args:
+            path: Database file, defaulting to MEMORY_SQLITE_PATH or
+                short_term_memory.db.
+            max_messages: Maximum number of messages kept per session.
+        """
+        super().__init__(max_messages=max_messages)
+        self.path = path or os.getenv("MEMORY_SQLITE_PATH", "short_term_memory.db")
+        self._conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        # WAL lets readers proceed while a write is in progress
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "session_key TEXT NOT NULL, "
+            "content TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_messages_session "
+            "ON messages (session_key, id)"
+        )
+        self._lock = threading.Lock()
+
+    def _select(self, key: str, limit: int):
+        rows = self._conn.execute(
+            "SELECT content FROM messages WHERE session_key = ? "
+            "ORDER BY id DESC LIMIT ?",
+            (key, limit),
+        )
+        return [row[0] for row in rows]
+
+    def _append(self, key: str, message: str):
+        self._conn.execute(
+            "INSERT INTO messages (session_key, content) VALUES (?, ?)", (key, message)
+        )
+        self._conn.execute(
+            "DELETE FROM messages WHERE session_key = ? AND id <= ("
+            "SELECT id FROM messages WHERE session_key = ? "
+            "ORDER BY id DESC LIMIT 1 OFFSET ?)",
+            (key, key, self.max_messages),
+        )
+
+    def store(self, key: str, message: str):
+        with self._lock, self._transaction():
+            self._append(key, message)
+
+    def append_and_fetch(self, key: str, message: str):
+        with self._lock, self._transaction():
+            previous = self._select(key, self.max_messages)
+            self._append(key, message)
+        return previous
+
+    def retrieve(self, key: str):
+        with self._lock:
+            return self._select(key, -1)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE session_key = ?", (key,))
+
+    def _transaction(self):
+        # Connection as context manager commits or rolls back the BEGIN below
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn
+
+    def close(self):
+        self._conn.close()
+
+
+def create_memory_backend(backend=None, max_messages=15) -> MemoryBackend:
+    """
+    Create the memory backend selected by configuration.
+
+    Args:
+        backend: "redis", "inprocess" or "sqlite". Defaults to the
+            MEMORY_BACKEND environment variable, then "redis".
+        max_messages: Maximum number of messages kept per session.
+    """
+    backend = (backend or os.getenv("MEMORY_BACKEND", "redis")).lower()
+    if backend == "inprocess":
+        return InProcessMemoryBackend(max_messages=max_messages)
+    if backend == "sqlite":
+        return SQLiteMemoryBackend(max_messages=max_messages)
+    if backend == "redis":
+        from data.cache.async_redis_cache import AsyncShortTermMemory
+        from data.cache.session_cache import SessionWindowCache
+
+        return AsyncShortTermMemory(
+            max_messages=max_messages, l1_cache=SessionWindowCache()
+        )
+    raise ValueError(f"Unknown MEMORY_BACKEND: {backend}")
+
+
+def benchmark_backends(
+    iterations: int = 500, backends=("inprocess", "sqlite", "redis")
+):
+    """Compare per-turn latency of the memory backends"""
+    import tempfile
+    import time
+
+    message = MemoryBackend.format_message(
+        "User", "Lập lịch học Toán và Lý cho tuần này"
+    )
+    key = "benchmark_session"
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault("MEMORY_SQLITE_PATH", os.path.join(tmp, "memory.db"))
+        for name in backends:
+            try:
+                memory = create_memory_backend(name)
+                memory.delete(key)
+            except Exception as e:
+                print(f"{name:>10}: unavailable ({e})")
+                continue
+
+            timings = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                # One chat turn: read context and store the question, then the answer
+                memory.append_and_fetch(key, message)
+                memory.store(key, message)
+                timings.append(time.perf_counter() - start)
+            memory.delete(key)
+
+            timings.sort()
+            mean = sum(timings) / len(timings)
+            p99 = timings[int(len(timings) * 0.99) - 1]
+            print(
+                f"{name:>10}: {mean * 1000:.3f} ms mean, {p99 * 1000:.3f} ms p99 per turn"
+            )
+
+
+if __name__ == "__main__":
+    benchmark_backends()
@@ -3,12 +3,38 @@ Memory Handler - Handle messages with short-term memory
 Separate complex logic to make main code readable
 """
 
+import asyncio
+
+import chainlit as cl
+import redis
+
+from data.cache.compactor import SessionCompactor
+from data.cache.long_term_memory import extract_student_id
+from data.cache.memory_backend import create_memory_backend
 from data.cache.redis_cache import ShortTermMemory
 
 
 class MessageMemoryHandler:
-    def __init__(self, max_messages: int = 15):
-        self.session_manager = ShortTermMemory(max_messages=max_messages)
+    def __init__(
+        self, max_messages: int = 15, backend: str = None, long_term_memory=None
+    ):
+        # backend: "redis", "inprocess" or "sqlite"; defaults to MEMORY_BACKEND
+        self.session_manager = create_memory_backend(
+            backend=backend, max_messages=max_messages
+        )
+        # Optional StudentMemoryStore recalled at the start of every turn
+        self.long_term_memory = long_term_memory
+        # Only Redis sessions outlive the process and need compacting
+        self.compactor = (
+            SessionCompactor(self.session_manager, long_term_memory=long_term_memory)
+            if isinstance(self.session_manager, ShortTermMemory)
+            else None
+        )
+
+    def start_compactor(self):
+        """Start background session compaction on the running event loop"""
+        if self.compactor is not None:
+            self.compactor.start()
 
     def get_history_message(self, message_content: str) -> str:
         """
@@ -23,11 +49,12 @@ class MessageMemoryHandler:
         session_key = self.session_manager.get_session_key()
         self.session_manager.update_message_count()
 
-        context = self.session_manager.get_history_context(session_key)
+        # Reads the history and stores the new message in one round trip
+        context = self.session_manager.store_user_message_with_context(
+            session_key, message_content
+        )
         full_message = f"{context}CURRENT QUESTION: {message_content}"
 
-        self.session_manager.store_user_message(session_key, message_content)
-
         return full_message
 
     def store_bot_response(self, response: str):
@@ -39,3 +66,66 @@ class MessageMemoryHandler:
         """Store error to memory"""
         session_key = self.session_manager.get_session_key()
         self.session_manager.store_error_message(session_key, error)
+
+    async def aget_history_message(self, message_content: str) -> str:
+        """Async version of get_history_message that does not block the event loop"""
+        session_key = self.session_manager.get_session_key()
+        self.session_manager.update_message_count()
+
+        context = await self.session_manager.astore_user_message_with_context(
+            session_key, message_content
+        )
+        student_context = await self.arecall_student_memory(
+            session_key, message_content
+        )
+        return f"{student_context}{context}CURRENT QUESTION: {message_content}"
+
+    async def arecall_student_memory(self, session_key: str, message_content: str):
+        """
+        Build the long-term memory block for the student of this session
+
+        The student ID is taken from the message when mentioned (and kept in
+        the Chainlit session), so a returning student does not have to repeat
+        what they said in earlier sessions.
+        """
+        if self.long_term_memory is None:
+            return ""
+        student_id = extract_student_id(message_content)
+        if student_id:
+            cl.user_session.set("student_id", student_id)
+        else:
+            student_id = cl.user_session.get("student_id")
+        if not student_id:
+            return ""
+
+        try:
+            recalled = await asyncio.to_thread(
+                self.long_term_memory.recall, student_id, message_content
+            )
+            if extract_student_id(message_content):
+                # Introductions carry the subject combination and study hours
+                await asyncio.to_thread(
+                    self.long_term_memory.remember,
+                    student_id,
+                    message_content,
+                    "profile",
+                )
+                await asyncio.to_thread(
+                    self.long_term_memory.link_session, session_key, student_id
+                )
+        except redis.RedisError as e:
+            print(f"Long-term memory unavailable: {e}")
+            recalled = []
+        return self.long_term_memory.format_context(student_id, recalled)
+
+    async def astore_bot_response(self, response: str):
+        """Store bot response to memory without blocking the event loop"""
+        session_key = self.session_manager.get_session_key()
+        await self.session_manager.astore_message(session_key, "Bot", response)
+
+    async def astore_error(self, error: Exception):
+        """Store error to memory without blocking the event loop"""
+        session_key = self.session_manager.get_session_key()
+        await self.session_manager.astore_message(
+            session_key, "System", f"Error - {str(error)}"
+        )
@@ -0,0 +1,125 @@
+"""
+Structured conversation records for short-term memory.
+
+Messages used to be stored as preformatted `[HH:MM] Role: content` strings,
+so every consumer had to re-parse and re-tokenize them. A `MessageRecord`
+carries the role, epoch timestamp, a token count computed once at write time
+and a flag marking compacted summaries, serialized as compact JSON. Strings
+written by older versions are still decoded.
+"""
+
+import json
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+LEGACY_MESSAGE_PATTERN = re.compile(r"^\[(\d{2}):(\d{2})\] ([^:]+): (.*)$", re.DOTALL)
+FALLBACK_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken, or approximate them if it is unavailable."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # Not installed or the encoding cannot be downloaded
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return len(FALLBACK_TOKEN_PATTERN.findall(text))
+
+
+@dataclass
+class MessageRecord:
+    """One stored message of a conversation."""
+
+    role: str
+    content: str
+    ts: float
+    tokens: int
+    summary: bool = False
+
+    @classmethod
+    def create(cls, role: str, content: str, summary: bool = False):
+        """Build a record stamped with the current time and its token count."""
+        return cls(role, content, time.time(), count_tokens(content), summary)
+
+    def encode(self) -> str:
+        """Serialize to compact JSON with short field names."""
+        data = {"r": self.role, "t": round(self.ts, 3), "n": self.tokens}
+        if self.summary:
+            data["s"] = 1
+        data["c"] = self.content
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def decode(cls, raw) -> "MessageRecord":
+        """Parse a stored record, accepting legacy preformatted strings."""
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8")
+        if raw.startswith("{"):
+            try:
+                data = json.loads(raw)
+                return cls(
+                    data["r"], data["c"], data["t"], data["n"], bool(data.get("s"))
+                )
+            except (ValueError, KeyError):
+                pass
+
+        match = LEGACY_MESSAGE_PATTERN.match(raw)
+        if match:
+            hour, minute, role, content = match.groups()
+            # Legacy strings only kept the time of day
+            ts = datetime.now().replace(
+                hour=int(hour), minute=int(minute), second=0, microsecond=0
+            )
+            return cls(role, content, ts.timestamp(), count_tokens(content))
+        return cls("", raw, 0.0, count_tokens(raw))
+
+    def render(self) -> str:
+        """Format as `[HH:MM] Role: content` for prompts."""
+        if not self.role:
+            return self.content
+        timestamp = datetime.fromtimestamp(self.ts).strftime("%H:%M")
+        return f"[{timestamp}] {self.role}: {self.content}"
+
+
+def select_window(
+    records: Iterable[MessageRecord],
+    token_budget: Optional[int] = None,
+    roles: Optional[Iterable[str]] = None,
+    max_messages: Optional[int] = None,
+) -> List[MessageRecord]:
+    """
+    Pick the most recent records that fit a message count and token budget.
+
+    Args:
+        records: Records ordered newest first, as stored in Redis.
+        token_budget: Maximum total tokens of the selected records.
+        roles: Only keep records with one of these roles.
+        max_messages: Maximum number of records to select.
+
+    Returns:
+        Selected records, newest first.
+    """
+    roles = set(roles) if roles is not None else None
+    selected = []
+    used = 0
+    for record in records:
+        if roles is not None and record.role not in roles:
+            continue
+        if max_messages is not None and len(selected) >= max_messages:
+            break
+        if token_budget is not None and used + record.tokens > token_budget:
+            break
+        selected.append(record)
+        used += record.tokens
+    return selected
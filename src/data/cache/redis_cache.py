@@ -1,86 +1,256 @@
+import os
+import time
+
 import redis
-import uuid
-from datetime import datetime
-import chainlit as cl
 
+from data.cache.compression import PayloadCodec
+from data.cache.memory_backend import MemoryBackend
+from data.cache.redis_client import sync_redis
+
+# KEYS: session list, version counter, last write time.
+# ARGV: message, max messages, max bytes (0 = no cap), idle TTL seconds
+# (0 = never expire), 1 to return the messages stored before `message`,
+# current Unix time.
+# Returns {new version, list length after trimming, previous messages}.
+APPEND_SCRIPT = """
+local max_messages = tonumber(ARGV[2])
+local max_bytes = tonumber(ARGV[3])
+local ttl = tonumber(ARGV[4])
+local previous = {}
+if ARGV[5] == '1' then
+    previous = redis.call('LRANGE', KEYS[1], 0, max_messages - 1)
+end
+redis.call('LPUSH', KEYS[1], ARGV[1])
+local keep = max_messages
+if max_bytes > 0 then
+    local total = 0
+    keep = 0
+    for i, item in ipairs(redis.call('LRANGE', KEYS[1], 0, max_messages - 1)) do
+        total = total + string.len(item)
+        -- Always keep the newest message, even if it alone exceeds the cap
+        if i > 1 and total > max_bytes then
+            break
+        end
+        keep = i
+    end
+end
+redis.call('LTRIM', KEYS[1], 0, keep - 1)
+local length = redis.call('LLEN', KEYS[1])
+local version = redis.call('INCR', KEYS[2])
+redis.call('SET', KEYS[3], ARGV[6])
+if ttl > 0 then
+    redis.call('EXPIRE', KEYS[1], ttl)
+    redis.call('EXPIRE', KEYS[2], ttl)
+    redis.call('EXPIRE', KEYS[3], ttl)
+end
+return {version, length, previous}
+"""
 
-class ShortTermMemory:
+
+class ShortTermMemory(MemoryBackend):
     """Manages user sessions and conversation memory with Redis backend"""
 
-    def __init__(self, host="localhost", port=6379, db=0, max_messages=15):
+    def __init__(
+        self,
+        host=None,
+        port=None,
+        db=None,
+        max_messages=15,
+        l1_cache=None,
+        ttl_seconds=None,
+        max_bytes=None,
+        codec=None,
+    ):
+        """
+        Args:
+            host, port, db: Redis location, defaulting to REDIS_HOST,
+                REDIS_PORT and REDIS_DB. The password is REDIS_PASSWORD.
+            max_messages: Maximum number of messages kept per session.
+            l1_cache: Optional in-process SessionWindowCache in front of Redis.
+            ttl_seconds: Idle seconds after which a session expires, defaulting
+                to MEMORY_SESSION_TTL_SECONDS (7 days). 0 disables expiry.
+            max_bytes: Maximum stored bytes per session, defaulting to
+                MEMORY_SESSION_MAX_BYTES (64 KiB). 0 disables the cap.
+            codec: PayloadCodec compressing large messages, configured from
+                MEMORY_COMPRESSION_THRESHOLD and MEMORY_COMPRESSION by default.
+        """
+        super().__init__(max_messages=max_messages)
         # Initialize Redis client
-        self.redis_client = redis.StrictRedis(host=host, port=port, db=db)
-        self.max_messages = max_messages  # Maximum number of messages to store
+        self.redis_client = sync_redis(host, port, db)
+        self.l1_cache = l1_cache
+        self.ttl_seconds = (
+            ttl_seconds
+            if ttl_seconds is not None
+            else int(os.getenv("MEMORY_SESSION_TTL_SECONDS", 7 * 24 * 3600))
+        )
+        self.max_bytes = (
+            max_bytes
+            if max_bytes is not None
+            else int(os.getenv("MEMORY_SESSION_MAX_BYTES", 64 * 1024))
+        )
+        self.codec = codec or PayloadCodec()
+        self._append_script = self.redis_client.register_script(APPEND_SCRIPT)
+
+    @staticmethod
+    def version_key(key: str) -> str:
+        """Key of the counter bumped on every write to a session list"""
+        return f"{key}:version"
+
+    @staticmethod
+    def touched_key(key: str) -> str:
+        """Key of the Unix time of the last message written to a session"""
+        return f"{key}:touched"
+
+    def _append_args(self, key: str, message: str, fetch: bool):
+        """Keys and arguments of APPEND_SCRIPT"""
+        keys = [key, self.version_key(key), self.touched_key(key)]
+        args = [
+            self.codec.encode(message),
+            self.max_messages,
+            self.max_bytes,
+            self.ttl_seconds,
+            1 if fetch else 0,
+            time.time(),
+        ]
+        return keys, args
+
+    def _finish_append(self, key: str, message: str, result, cached):
+        """
+        Update the L1 cache from the reply of APPEND_SCRIPT.
+
+        Returns:
+            The messages stored before `message` (newest first), or None if
+            the cached window turned out to be stale and must be re-read.
+        """
+        new_version, length, previous = result
+        if cached is None:
+            previous = [self.codec.decode(msg) for msg in previous]
+        elif new_version == cached.version + 1:
+            self.l1_cache.record_hit()
+            previous = list(cached.messages)
+        else:
+            # Another worker wrote to this session since we cached it
+            self.l1_cache.invalidate(key, stale=True)
+            return None
+        if self.l1_cache is not None:
+            # `length` reflects both the message and the byte cap
+            self.l1_cache.put(key, new_version, ([message] + previous)[:length])
+        return previous
+
+    def _finish_store(self, key: str, message: str, result, cached):
+        """Keep the L1 window in step with a write that did not read the list"""
+        new_version, length, _ = result
+        if cached is None:
+            return
+        if new_version == cached.version + 1:
+            window = ([message] + list(cached.messages))[:length]
+            self.l1_cache.put(key, new_version, window)
+        else:
+            self.l1_cache.invalidate(key, stale=True)
+
+    def _cached_window(self, key: str):
+        return self.l1_cache.get(key) if self.l1_cache is not None else None
 
     def store(self, key: str, message: str):
         """Store a message in Redis, keeping only the latest 'max_messages' messages."""
-        self.redis_client.lpush(key, message)
+        # Append, trim, version bump and TTL refresh run in one script call
+        cached = self._cached_window(key)
+        keys, args = self._append_args(key, message, fetch=False)
+        result = self._append_script(keys=keys, args=args)
+        self._finish_store(key, message, result, cached)
+        print(f"Stored message: {message} for key: {key}. Total messages: {result[1]}")
 
-        # Trim the list to ensure it doesn't exceed the max size
-        self.redis_client.ltrim(key, 0, self.max_messages - 1)
-        print(
-            f"Stored message: {message} for key: {key}. Total messages: {self.redis_client.llen(key)}"
-        )
+    def append_and_fetch(self, key: str, message: str):
+        """
+        Store a message and return the messages stored before it.
+
+        Reading the window, appending and trimming happen atomically in one
+        round trip. With an L1 cache, a coherent cached window is used instead
+        of reading the list back from Redis.
+
+        Returns:
+            List of previous messages, newest first.
+        """
+        cached = self._cached_window(key)
+        keys, args = self._append_args(key, message, fetch=cached is None)
+        result = self._append_script(keys=keys, args=args)
+        previous = self._finish_append(key, message, result, cached)
+        if previous is None:
+            previous = self.retrieve(key)[1:]
+        return previous
 
     def retrieve(self, key: str):
         """Retrieve all messages from Redis for a session (key)."""
-        messages = self.redis_client.lrange(key, 0, -1)
-        return [
-            msg.decode("utf-8") for msg in messages
-        ]  # Decode each message from bytes
+        cached = self._cached_window(key)
+        if cached is not None:
+            version = self.redis_client.get(self.version_key(key))
+            if version is not None and int(version) == cached.version:
+                self.l1_cache.record_hit()
+                return list(cached.messages)
+            self.l1_cache.invalidate(key, stale=True)
+
+        pipe = self.redis_client.pipeline()
+        pipe.lrange(key, 0, -1)
+        pipe.get(self.version_key(key))
+        messages, version = pipe.execute()
+        messages = [
+            self.codec.decode(msg) for msg in messages
+        ]  # Decode (and decompress) each message from bytes
+        if self.l1_cache is not None and version is not None:
+            self.l1_cache.put(key, int(version), messages)
+        return messages
 
     def delete(self, key: str):
         """Delete all messages for a given key."""
-        self.redis_client.delete(key)
+        self.redis_client.delete(key, self.version_key(key), self.touched_key(key))
+        if self.l1_cache is not None:
+            self.l1_cache.invalidate(key)
         print(f"Deleted all messages for key: {key}")
 
-    def get_session_key(self):
-        """Get or create session key"""
-        session_key = cl.user_session.get("session_key")
-        if not session_key:
-            session_key = (
-                f"user_{str(uuid.uuid4())[:8]}_{datetime.now().strftime('%Y%m%d_%H%M')}"
-            )
-            cl.user_session.set("session_key", session_key)
-        return session_key
-
-    def get_history_context(self, session_key):
-        """Build conversation history context"""
-        history = self.retrieve(session_key)
-        if len(history) == 0:
-            return ""
-
-        # Redis LPUSH puts newest first, so reverse to get chronological order
-        # Take up to 8 most recent messages in chronological order
-        recent = list(reversed(history))[:8]
-        context = "\n=== CONVERSATION HISTORY ===\n"
-        if len(history) > 8:
-            context += "[Showing last 8 messages]\n"
-
-        return context + "\n".join(recent) + "\n=== END HISTORY ===\n\n"
-
-    def store_message(self, session_key, role, content):
-        """Store a message with timestamp"""
-        timestamp = datetime.now().strftime("%H:%M")
-        self.store(session_key, f"[{timestamp}] {role}: {content}")
-
-    def store_user_message(self, session_key, content):
-        """Store user message"""
-        self.store_message(session_key, "User", content)
-
-    def store_bot_message(self, session_key, content):
-        """Store bot message"""
-        self.store_message(session_key, "Bot", content)
-
-    def store_error_message(self, session_key, error):
-        """Store error message"""
-        self.store_message(session_key, "System", f"Error - {str(error)}")
-
-    def update_message_count(self):
-        """Update and return message count"""
-        count = (cl.user_session.get("message_count") or 0) + 1
-        cl.user_session.set("message_count", count)
-        return count
+    def session_keys(self, pattern: str = "user_*"):
+        """Iterate over stored session list keys (as created by get_session_key)"""
+        for key in self.redis_client.scan_iter(match=pattern, count=500):
+            key = key.decode("utf-8")
+            if not key.endswith((":version", ":touched")):
+                yield key
+
+    def _session_bytes(self, key: str) -> int:
+        try:
+            return self.redis_client.memory_usage(key) or 0
+        except redis.ResponseError:
+            # MEMORY USAGE is disabled on some managed Redis services
+            return sum(len(item) for item in self.redis_client.lrange(key, 0, -1))
+
+    def memory_stats(self, sample_size: int = 200):
+        """
+        Report session key counts and Redis memory usage.
+
+        Args:
+            sample_size: Number of sessions whose MEMORY USAGE is sampled to
+                estimate the average session size.
+        """
+        session_count = 0
+        sampled_bytes = 0
+        sampled = 0
+        without_ttl = 0
+        for key in self.session_keys():
+            session_count += 1
+            if sampled < sample_size:
+                sampled_bytes += self._session_bytes(key)
+                if self.redis_client.ttl(key) == -1:
+                    without_ttl += 1
+                sampled += 1
+        info = self.redis_client.info("memory")
+        return {
+            "sessions": session_count,
+            "avg_session_bytes": sampled_bytes / sampled if sampled else 0,
+            "sampled_without_ttl": without_ttl,
+            "used_memory_bytes": info.get("used_memory"),
+            "ttl_seconds": self.ttl_seconds,
+            "max_bytes": self.max_bytes,
+            "max_messages": self.max_messages,
+            "compression": self.codec.stats(),
+        }
 
 
 def test_session_manager():
@@ -115,6 +285,40 @@ def test_session_manager():
     print(manager.retrieve(session_key))
 
 
+def benchmark_store(iterations: int = 500):
+    """Compare sequential commands with the single-round-trip append script"""
+    import time
+
+    manager = ShortTermMemory(max_messages=15)
+    client = manager.redis_client
+    key = "benchmark_session"
+    message = manager.format_message("User", "Lập lịch học Toán và Lý cho tuần này")
+
+    def sequential():
+        # Original behaviour: LRANGE for the context, then LPUSH, LTRIM, LLEN
+        client.lrange(key, 0, -1)
+        client.lpush(key, message)
+        client.ltrim(key, 0, manager.max_messages - 1)
+        client.llen(key)
+
+    def scripted():
+        manager.append_and_fetch(key, message)
+
+    for name, step in (("sequential", sequential), ("scripted", scripted)):
+        manager.delete(key)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            step()
+        elapsed = time.perf_counter() - start
+        print(f"{name:>10}: {elapsed / iterations * 1000:.3f} ms per message")
+    manager.delete(key)
+
+
 # Call the test function when run directly
 if __name__ == "__main__":
-    test_session_manager()
+    import sys
+
+    if "--benchmark" in sys.argv:
+        benchmark_store()
+    else:
+        test_session_manager()
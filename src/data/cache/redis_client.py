@@ -0,0 +1,68 @@
+"""
+Redis clients built from the shared REDIS_* settings.
+
+Every component that talks to Redis (session memory, long-term memory, locks,
+the compactor and the LLM rate limiter) gets its client here, so host, port,
+database and password are read in one place and no client ends up without
+the password.
+"""
+
+import os
+from typing import Optional
+
+import redis
+import redis.asyncio as aioredis
+
+
+def redis_settings(
+    host: Optional[str] = None,
+    port: Optional[int] = None,
+    db: Optional[int] = None,
+    password: Optional[str] = None,
+) -> dict:
+    """
+    Connection settings, each falling back to its environment variable.
+
+    Args:
+        host, port, db, password: Overrides of REDIS_HOST (localhost),
+            REDIS_PORT (6379), REDIS_DB (0) and REDIS_PASSWORD (none).
+    """
+    return {
+        "host": host or os.getenv("REDIS_HOST", "localhost"),
+        "port": int(port or os.getenv("REDIS_PORT", 6379)),
+        "db": db if db is not None else int(os.getenv("REDIS_DB", 0)),
+        "password": password or os.getenv("REDIS_PASSWORD") or None,
+    }
+
+
+def sync_redis(host=None, port=None, db=None, password=None, **options) -> redis.Redis:
+    """Blocking client; extra options go to `redis.Redis`."""
+    return redis.Redis(**redis_settings(host, port, db, password), **options)
+
+
+def async_redis_pool(
+    host=None, port=None, db=None, password=None, **options
+) -> aioredis.ConnectionPool:
+    """asyncio connection pool; extra options go to `ConnectionPool`."""
+    return aioredis.ConnectionPool(
+        **redis_settings(host, port, db, password), **options
+    )
+
+
+def async_redis(
+    host=None, port=None, db=None, password=None, **options
+) -> aioredis.Redis:
+    """asyncio client; extra options go to `redis.asyncio.Redis`."""
+    return aioredis.Redis(**redis_settings(host, port, db, password), **options)
+
+
+def async_redis_like(client: redis.Redis, **options) -> aioredis.Redis:
+    """asyncio client for the same server, database and password as `client`."""
+    kwargs = client.connection_pool.connection_kwargs
+    return async_redis(
+        kwargs.get("host"),
+        kwargs.get("port"),
+        kwargs.get("db"),
+        kwargs.get("password"),
+        **options,
+    )
@@ -0,0 +1,405 @@
+"""
+Semantic answer cache.
+
+Students often ask the same conceptual question with different wording. The
+cache embeds each question and looks up its nearest neighbour among recently
+answered questions; when the similarity is above a threshold the stored answer
+is returned instead of running the agent again.
+
+With a `LocalVectorIndex` the answers live in the process. A
+`MilvusVectorIndex` stores each answer and its creation time with its vector,
+so every worker shares the cache and entries survive restarts; expired and
+excess rows are deleted from the collection periodically.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+@dataclass
+class CachedAnswer:
+    """A cached question/answer pair."""
+
+    question: str
+    answer: str
+    created_at: float = field(default_factory=time.time)
+    hits: int = 0
+
+
+class LocalVectorIndex:
+    """Brute-force cosine similarity index over an in-memory float32 matrix."""
+
+    shared = False
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+
+    def add(self, entry_id: str, vector: np.ndarray):
+        """Add a normalized vector under `entry_id`."""
+        self._positions[entry_id] = len(self._ids)
+        self._ids.append(entry_id)
+        self._vectors = np.vstack([self._vectors, vector.reshape(1, -1)])
+
+    def remove(self, entry_id: str):
+        """Remove a vector, moving the last row into its slot."""
+        pos = self._positions.pop(entry_id, None)
+        if pos is None:
+            return
+        last = len(self._ids) - 1
+        if pos != last:
+            self._vectors[pos] = self._vectors[last]
+            self._ids[pos] = self._ids[last]
+            self._positions[self._ids[pos]] = pos
+        self._ids.pop()
+        self._vectors = self._vectors[:last]
+
+    def search(self, vector: np.ndarray, k: int = 1) -> List[Tuple[str, float]]:
+        """Return up to `k` (entry_id, cosine similarity) pairs, best first."""
+        if not self._ids:
+            return []
+        scores = self._vectors @ vector
+        k = min(k, len(self._ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self._ids[i], float(scores[i])) for i in top]
+
+
+class MilvusVectorIndex:
+    """
+    Vector index stored in a Milvus collection, shared by every worker.
+
+    Rows carry the cached question, answer and creation time, so any worker
+    can serve an answer another one stored.
+    """
+
+    shared = True
+    # Seconds between deletions of expired and excess rows, per process
+    maintenance_interval = 60.0
+
+    def __init__(self, dim: int, collection_name: str = "semantic_answer_cache"):
+        from pymilvus import (
+            Collection,
+            CollectionSchema,
+            DataType,
+            FieldSchema,
+            connections,
+            utility,
+        )
+
+        connections.connect(
+            alias="default",
+            uri=os.getenv("MILVUS_URI"),
+            token=f"{os.getenv('MILVUS_TOKEN')}",
+        )
+        if utility.has_collection(collection_name) and not self._compatible(
+            Collection(collection_name), dim
+        ):
+            # Written by an older version (vectors only) or another model
+            utility.drop_collection(collection_name)
+        if not utility.has_collection(collection_name):
+            schema = CollectionSchema(
+                fields=[
+                    FieldSchema(
+                        name="ID",
+                        dtype=DataType.VARCHAR,
+                        is_primary=True,
+                        max_length=64,
+                    ),
+                    FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=dim),
+                    FieldSchema(
+                        name="question", dtype=DataType.VARCHAR, max_length=65535
+                    ),
+                    FieldSchema(
+                        name="answer", dtype=DataType.VARCHAR, max_length=65535
+                    ),
+                    FieldSchema(name="created_at", dtype=DataType.DOUBLE),
+                ],
+                description="Semantic answer cache",
+            )
+            collection = Collection(name=collection_name, schema=schema)
+            collection.create_index(
+                field_name="embedding",
+                index_params={
+                    "metric_type": "IP",
+                    "index_type": "FLAT",
+                    "params": {},
+                },
+            )
+        self.dim = dim
+        self.collection = Collection(collection_name)
+        self.collection.load()
+        self._maintained_at = 0.0
+
+    @staticmethod
+    def _compatible(collection, dim: int) -> bool:
+        fields = {f.name: f for f in collection.schema.fields}
+        return (
+            "answer" in fields
+            and "created_at" in fields
+            and int(fields["embedding"].params.get("dim", 0)) == dim
+        )
+
+    def add(self, entry_id: str, vector: np.ndarray, entry: CachedAnswer):
+        self.collection.insert(
+            [
+                [entry_id],
+                [vector.tolist()],
+                [entry.question],
+                [entry.answer],
+                [entry.created_at],
+            ]
+        )
+
+    def remove(self, entry_id: str):
+        self.collection.delete(f'ID in ["{entry_id}"]')
+
+    def search(
+        self, vector: np.ndarray, k: int = 1, min_created_at: float = 0.0
+    ) -> List[Tuple[str, float, CachedAnswer]]:
+        """Return up to `k` unexpired (entry_id, similarity, entry), best first."""
+        results = self.collection.search(
+            data=[vector.tolist()],
+            anns_field="embedding",
+            param={"metric_type": "IP", "params": {}},
+            limit=k,
+            expr=f"created_at >= {min_created_at}",
+            output_fields=["question", "answer", "created_at"],
+        )
+        return [
+            (
+                hit.id,
+                float(hit.score),
+                CachedAnswer(
+                    question=hit.entity.get("question"),
+                    answer=hit.entity.get("answer"),
+                    created_at=hit.entity.get("created_at"),
+                ),
+            )
+            for hit in results[0]  # type: ignore
+        ]
+
+    def count(self) -> int:
+        return self.collection.query(expr="", output_fields=["count(*)"])[0]["count(*)"]
+
+    def maintain(self, min_created_at: float, max_entries: int) -> Tuple[int, int]:
+        """
+        Delete expired rows and the oldest rows beyond `max_entries`, at most
+        once per `maintenance_interval`.
+
+        Returns:
+            The number of expired and of evicted rows deleted.
+        """
+        if time.monotonic() - self._maintained_at < self.maintenance_interval:
+            return 0, 0
+        self._maintained_at = time.monotonic()
+        expired = self.collection.delete(f"created_at < {min_created_at}").delete_count
+        evicted = 0
+        excess = self.count() - max_entries
+        if excess > 0:
+            rows = self.collection.query(
+                expr="created_at >= 0",
+                output_fields=["ID", "created_at"],
+                limit=16384,
+            )
+            rows.sort(key=lambda row: row["created_at"])
+            oldest = [row["ID"] for row in rows[:excess]]
+            self.collection.delete(f"ID in {json.dumps(oldest)}")
+            evicted = len(oldest)
+        return expired, evicted
+
+    def clear(self):
+        self.collection.delete("created_at >= 0")
+
+
+class SemanticAnswerCache:
+    """
+    Nearest-neighbour cache of agent answers keyed by question embeddings.
+
+    Entries expire after `ttl_seconds`, and the least recently used entry is
+    evicted once `max_entries` is reached (the oldest, with a shared Milvus
+    index).
+    """
+
+    def __init__(
+        self,
+        embedding_engine=None,
+        index=None,
+        threshold: float = 0.92,
+        ttl_seconds: int = 24 * 3600,
+        max_entries: int = 1000,
+        min_question_chars: int = 12,
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            embedding_engine: EmbeddingEngine used to embed questions. Created
+                lazily with the default model when omitted.
+            index: Vector index (`LocalVectorIndex` or `MilvusVectorIndex`).
+                A local index is created on first use when omitted.
+            threshold: Minimum cosine similarity for a cache hit.
+            ttl_seconds: Lifetime of a cached answer.
+            max_entries: Maximum number of cached answers.
+            min_question_chars: Shorter questions (usually follow-ups that
+                depend on the conversation) bypass the cache.
+        """
+        self._embedding_engine = embedding_engine
+        self.index = index
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.min_question_chars = min_question_chars
+        self._entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+    @property
+    def embedding_engine(self):
+        if self._embedding_engine is None:
+            from data.embeddings.embedding_engine import get_engine
+
+            self._embedding_engine = get_engine()
+        return self._embedding_engine
+
+    def _embed(self, question: str) -> Optional[np.ndarray]:
+        vector = np.asarray(
+            self.embedding_engine.get_query_embedding(question.strip()),
+            dtype=np.float32,
+        )
+        norm = np.linalg.norm(vector)
+        if vector.size == 0 or norm == 0:
+            return None
+        return vector / norm
+
+    def _cacheable(self, question: str, context: str = "") -> bool:
+        # Answers shaped by history or student memory must not be shared
+        return not context.strip() and len(question.strip()) >= self.min_question_chars
+
+    def lookup(self, question: str, context: str = "") -> Optional[str]:
+        """
+        Return a cached answer for a semantically similar question.
+
+        Args:
+            question: The user's question, without conversation history.
+            context: Conversation history and student memory sent with the
+                question; turns with any context always miss.
+
+        Returns:
+            The cached answer, or None on a miss.
+        """
+        if not self._cacheable(question, context):
+            return None
+        vector = self._embed(question)
+        with self._lock:
+            if vector is None or self.index is None:
+                self.metrics["misses"] += 1
+                return None
+
+            if self._shared:
+                # Expired rows are filtered out by Milvus and deleted in store
+                hits = self.index.search(
+                    vector, k=1, min_created_at=time.time() - self.ttl_seconds
+                )
+                if hits and hits[0][1] >= self.threshold:
+                    self.metrics["hits"] += 1
+                    return hits[0][2].answer
+                self.metrics["misses"] += 1
+                return None
+
+            for entry_id, score in self.index.search(vector, k=3):
+                entry = self._entries.get(entry_id)
+                if entry is None:
+                    continue
+                if time.time() - entry.created_at > self.ttl_seconds:
+                    self._remove(entry_id)
+                    self.metrics["expirations"] += 1
+                    continue
+                if score >= self.threshold:
+                    entry.hits += 1
+                    self._entries.move_to_end(entry_id)
+                    self.metrics["hits"] += 1
+                    return entry.answer
+                break
+
+            self.metrics["misses"] += 1
+            return None
+
+    def store(self, question: str, answer: str, context: str = ""):
+        """
+        Cache `answer` for `question`, evicting the oldest entries if full.
+
+        Args:
+            question: The user's question.
+            answer: The answer sent for it.
+            context: Conversation history and student memory the answer was
+                generated with; turns with any context are not cached.
+        """
+        if not self._cacheable(question, context) or not answer:
+            return
+        vector = self._embed(question)
+        if vector is None:
+            return
+        with self._lock:
+            if self.index is None:
+                self.index = LocalVectorIndex(dim=vector.shape[0])
+            entry_id = uuid.uuid4().hex
+            if self._shared:
+                self.index.add(
+                    entry_id, vector, CachedAnswer(question=question, answer=answer)
+                )
+                self.metrics["stores"] += 1
+                expired, evicted = self.index.maintain(
+                    time.time() - self.ttl_seconds, self.max_entries
+                )
+                self.metrics["expirations"] += expired
+                self.metrics["evictions"] += evicted
+                return
+            while len(self._entries) >= self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self.metrics["evictions"] += 1
+            self._entries[entry_id] = CachedAnswer(question=question, answer=answer)
+            self.index.add(entry_id, vector)
+            self.metrics["stores"] += 1
+
+    @property
+    def _shared(self) -> bool:
+        return getattr(self.index, "shared", False)
+
+    def _remove(self, entry_id: str):
+        self._entries.pop(entry_id, None)
+        self.index.remove(entry_id)
+
+    def clear(self):
+        """Remove every cached answer."""
+        with self._lock:
+            if self._shared:
+                self.index.clear()
+            for entry_id in list(self._entries):
+                self._remove(entry_id)
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters, the hit rate and the number of entries."""
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            **self.metrics,
+            "entries": self.index.count() if self._shared else len(self._entries),
+            "hit_rate": self.metrics["hits"] / lookups if lookups else 0.0,
+        }
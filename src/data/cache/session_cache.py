@@ -0,0 +1,66 @@
+"""
+In-process L1 cache of recent session windows.
+
+The worker that handles a session usually wrote its history moments earlier,
+so re-reading the whole list from Redis on every turn is wasted work. The
+cache keeps the latest window per session together with the version stamp
+Redis returned for it; a write whose new version is exactly one above the
+cached version proves no other worker touched the session in between.
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class CachedWindow:
+    """A session window (newest first) and the Redis version it matches."""
+
+    version: int
+    messages: Tuple[str, ...]
+
+
+class SessionWindowCache:
+    """Thread-safe LRU of session windows keyed by session key."""
+
+    def __init__(self, max_sessions: int = 1024):
+        self.max_sessions = max_sessions
+        self._windows: "OrderedDict[str, CachedWindow]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0}
+
+    def get(self, key: str) -> Optional[CachedWindow]:
+        """Return the cached window for `key`, or None."""
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                self.metrics["misses"] += 1
+                return None
+            self._windows.move_to_end(key)
+            return window
+
+    def put(self, key: str, version: int, messages):
+        """Cache `messages` (newest first) as version `version` of `key`."""
+        with self._lock:
+            self._windows[key] = CachedWindow(version, tuple(messages))
+            self._windows.move_to_end(key)
+            while len(self._windows) > self.max_sessions:
+                self._windows.popitem(last=False)
+                self.metrics["evictions"] += 1
+
+    def record_hit(self):
+        with self._lock:
+            self.metrics["hits"] += 1
+
+    def invalidate(self, key: str, stale: bool = False):
+        """Drop `key`, counting it as stale if another worker changed it."""
+        with self._lock:
+            if self._windows.pop(key, None) is not None and stale:
+                self.metrics["stale"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss/stale counters and the number of cached sessions."""
+        with self._lock:
+            return {**self.metrics, "sessions": len(self._windows)}
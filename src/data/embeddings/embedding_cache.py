@@ -0,0 +1,336 @@
+"""
+Persistent, content-addressed cache of text embeddings.
+
+Vectors are keyed by (model name, SHA-1 of the text), so re-indexing an
+unchanged FAQ row or repeating a query never re-runs the model. The key
+index lives in SQLite (WAL mode, safe to share between processes) and maps
+each key to a row ("slot") of a memory-mapped float32 matrix, one matrix file
+per model. The cache holds at most `max_entries` vectors per model; when it
+is full the least recently used tenth is evicted and its slots are reused.
+If `max_entries` is lowered, vectors in slots past the new limit are misses
+and are evicted on the next store.
+
+Slots are handed out from a free list and a per-model counter, so storing a
+vector does not scan the index. Evictions are committed before their slots
+are overwritten, and readers re-check their hits after copying the vectors,
+so a vector being replaced by another process is treated as a miss rather
+than returned for the wrong text. Hits refresh `last_used` in memory; the
+timestamps are written back in batches.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# SQLite limits the number of bound parameters per statement
+_CHUNK = 500
+# Seconds between write-backs of last_used for cache hits
+_TOUCH_INTERVAL = 30.0
+_TOUCH_MAX_PENDING = 10000
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite index plus memory-mapped float32 vectors, bounded per model"""
+
+    def __init__(
+        self, directory: Optional[str] = None, max_entries: Optional[int] = None
+    ):
+        """
+        Args:
+            directory: Where the index and vector files live, defaulting to
+                EMBEDDING_CACHE_DIR or .cache/embeddings.
+            max_entries: Vectors kept per model, defaulting to
+                EMBEDDING_CACHE_MAX_ENTRIES (50000).
+        """
+        self.directory = directory or os.getenv(
+            "EMBEDDING_CACHE_DIR", os.path.join(".cache", "embeddings")
+        )
+        self.max_entries = max_entries or int(
+            os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 50000)
+        )
+        os.makedirs(self.directory, exist_ok=True)
+        self._conn = sqlite3.connect(
+            os.path.join(self.directory, "index.sqlite"),
+            check_same_thread=False,
+            isolation_level=None,
+            timeout=30,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "model TEXT NOT NULL, "
+            "text_hash TEXT NOT NULL, "
+            "slot INTEGER NOT NULL, "
+            "last_used REAL NOT NULL, "
+            "PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_entries_lru ON entries (model, last_used)"
+        )
+        # Next never-used slot of each model, and slots freed by eviction
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS slots ("
+            "model TEXT PRIMARY KEY, next_slot INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS free_slots ("
+            "model TEXT NOT NULL, slot INTEGER NOT NULL, PRIMARY KEY (model, slot))"
+        )
+        self._lock = threading.Lock()
+        self._matrices: Dict[Tuple[str, int], np.memmap] = {}
+        # (model key, text hash) -> last hit time, not yet written to SQLite
+        self._touched: Dict[Tuple[str, str], float] = {}
+        self._touched_at = time.monotonic()
+        self.metrics = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _model_key(self, model: str, dim: int) -> str:
+        # Different dimensions under one name (e.g. truncated vectors) never mix
+        return f"{model}@{dim}"
+
+    def _matrix(self, model: str, dim: int) -> np.memmap:
+        key = (model, dim)
+        if key not in self._matrices:
+            safe = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+            path = os.path.join(self.directory, f"{safe}_{dim}.f32")
+            size = self.max_entries * dim * 4
+            # Grow in place rather than recreate: other processes may map it
+            with open(path, "ab") as f:
+                if f.tell() < size:
+                    f.truncate(size)
+            self._matrices[key] = np.memmap(
+                path, dtype=np.float32, mode="r+", shape=(self.max_entries, dim)
+            )
+        return self._matrices[key]
+
+    def get_many(
+        self, model: str, dim: int, texts: List[str]
+    ) -> Tuple[np.ndarray, List[int]]:
+        """
+        Look up cached vectors.
+
+        Returns:
+            A (len(texts), dim) float32 matrix with the cached rows filled in,
+            and the indices of the texts that were not cached.
+        """
+        model_key = self._model_key(model, dim)
+        hashes = [text_hash(text) for text in texts]
+        with self._lock:
+            unique = list(dict.fromkeys(hashes))
+            # Slots past max_entries were stored under a larger limit; they are
+            # misses here and put_many evicts them
+            slots = {
+                h: slot
+                for h, slot in self._lookup(model_key, unique).items()
+                if slot < self.max_entries
+            }
+            matrix = self._matrix(model, dim)
+            result = np.empty((len(texts), dim), dtype=np.float32)
+            for i, h in enumerate(hashes):
+                if h in slots:
+                    result[i] = matrix[slots[h]]
+            if slots:
+                # Another process may have evicted a slot while it was copied
+                current = self._lookup(model_key, list(slots))
+                slots = {h: s for h, s in slots.items() if current.get(h) == s}
+                now = time.time()
+                for h in slots:
+                    self._touched[(model_key, h)] = now
+                if (
+                    time.monotonic() - self._touched_at > _TOUCH_INTERVAL
+                    or len(self._touched) >= _TOUCH_MAX_PENDING
+                ):
+                    self._flush_touched()
+            missing = [i for i, h in enumerate(hashes) if h not in slots]
+        self.metrics["hits"] += len(texts) - len(missing)
+        self.metrics["misses"] += len(missing)
+        return result, missing
+
+    def _lookup(self, model_key: str, hashes: List[str]) -> Dict[str, int]:
+        slots: Dict[str, int] = {}
+        for start in range(0, len(hashes), _CHUNK):
+            chunk = hashes[start : start + _CHUNK]
+            slots.update(
+                self._conn.execute(
+                    "SELECT text_hash, slot FROM entries WHERE model = ? "
+                    f"AND text_hash IN ({','.join('?' * len(chunk))})",
+                    [model_key, *chunk],
+                )
+            )
+        return slots
+
+    def _flush_touched(self):
+        """Write buffered last_used times of cache hits back to SQLite."""
+        if self._touched:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "UPDATE entries SET last_used = MAX(last_used, ?) "
+                    "WHERE model = ? AND text_hash = ?",
+                    [(t, model_key, h) for (model_key, h), t in self._touched.items()],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._touched.clear()
+        self._touched_at = time.monotonic()
+
+    def put_many(self, model: str, texts: List[str], vectors: np.ndarray):
+        """Store vectors for texts, evicting least recently used entries if full."""
+        if not texts:
+            return
+        dim = vectors.shape[1]
+        model_key = self._model_key(model, dim)
+        pending = {text_hash(text): i for i, text in enumerate(texts)}
+        with self._lock:
+            # Eviction must see recent hits
+            self._flush_touched()
+            # First transaction: claim slots, committing any eviction before
+            # the evicted slots are overwritten (see get_many)
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                known = self._lookup(model_key, list(pending))
+                new = [h for h in pending if h not in known][: self.max_entries]
+                slots = self._allocate(model_key, len(new))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+            matrix = self._matrix(model, dim)
+            for h, slot in zip(new, slots):
+                matrix[slot] = vectors[pending[h]]
+            matrix.flush()
+
+            # Second transaction: publish the entries
+            now = time.time()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process may have stored some of these texts meanwhile
+                stored = self._lookup(model_key, new)
+                self._conn.executemany(
+                    "INSERT INTO entries (model, text_hash, slot, last_used) "
+                    "VALUES (?, ?, ?, ?)",
+                    [
+                        (model_key, h, slot, now)
+                        for h, slot in zip(new, slots)
+                        if h not in stored
+                    ],
+                )
+                self._conn.executemany(
+                    "INSERT INTO free_slots (model, slot) VALUES (?, ?)",
+                    [(model_key, slot) for h, slot in zip(new, slots) if h in stored],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        self.metrics["stores"] += len(new)
+
+    def _allocate(self, model_key: str, count: int) -> List[int]:
+        """Return `count` free slots, evicting LRU entries when the matrix is full"""
+        if count == 0:
+            return []
+        row = self._conn.execute(
+            "SELECT next_slot FROM slots WHERE model = ?", (model_key,)
+        ).fetchone()
+        next_slot = row[0] if row is not None else self._init_slots(model_key)
+        if next_slot > self.max_entries:
+            next_slot = self._shrink(model_key)
+
+        free = [
+            slot
+            for (slot,) in self._conn.execute(
+                "SELECT slot FROM free_slots WHERE model = ? LIMIT ?",
+                (model_key, count),
+            )
+        ]
+        self._conn.executemany(
+            "DELETE FROM free_slots WHERE model = ? AND slot = ?",
+            [(model_key, slot) for slot in free],
+        )
+        fresh = min(count - len(free), max(self.max_entries - next_slot, 0))
+        free.extend(range(next_slot, next_slot + fresh))
+        self._conn.execute(
+            "UPDATE slots SET next_slot = ? WHERE model = ?",
+            (next_slot + fresh, model_key),
+        )
+
+        if len(free) < count:
+            # Evict at least a tenth at once so we do not evict on every put
+            evict = max(count - len(free), self.max_entries // 10)
+            victims = self._conn.execute(
+                "SELECT text_hash, slot FROM entries WHERE model = ? "
+                "ORDER BY last_used LIMIT ?",
+                (model_key, evict),
+            ).fetchall()
+            self._conn.executemany(
+                "DELETE FROM entries WHERE model = ? AND text_hash = ?",
+                [(model_key, h) for h, _ in victims],
+            )
+            needed = count - len(free)
+            free.extend(slot for _, slot in victims[:needed])
+            self._conn.executemany(
+                "INSERT INTO free_slots (model, slot) VALUES (?, ?)",
+                [(model_key, slot) for _, slot in victims[needed:]],
+            )
+            self.metrics["evictions"] += len(victims)
+        return free
+
+    def _shrink(self, model_key: str) -> int:
+        """Evict entries and free slots beyond a lowered max_entries."""
+        evicted = self._conn.execute(
+            "DELETE FROM entries WHERE model = ? AND slot >= ?",
+            (model_key, self.max_entries),
+        ).rowcount
+        self._conn.execute(
+            "DELETE FROM free_slots WHERE model = ? AND slot >= ?",
+            (model_key, self.max_entries),
+        )
+        self._conn.execute(
+            "UPDATE slots SET next_slot = ? WHERE model = ?",
+            (self.max_entries, model_key),
+        )
+        self.metrics["evictions"] += evicted
+        return self.max_entries
+
+    def _init_slots(self, model_key: str) -> int:
+        """Start slot tracking for a model, adopting entries stored before it."""
+        used = {
+            slot
+            for (slot,) in self._conn.execute(
+                "SELECT slot FROM entries WHERE model = ?", (model_key,)
+            )
+        }
+        next_slot = max(used) + 1 if used else 0
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO free_slots (model, slot) VALUES (?, ?)",
+            [(model_key, slot) for slot in range(next_slot) if slot not in used],
+        )
+        self._conn.execute(
+            "INSERT INTO slots (model, next_slot) VALUES (?, ?)",
+            (model_key, next_slot),
+        )
+        return next_slot
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            **self.metrics,
+            "entries": len(self),
+            "hit_rate": self.metrics["hits"] / lookups if lookups else 0.0,
+        }
@@ -1,7 +1,18 @@
-from typing import List
-from sentence_transformers import SentenceTransformer
+import asyncio
+import os
+import sqlite3
+import threading
+from typing import List, Optional, Union
+
+import httpx
+import numpy as np
 from dotenv import load_dotenv
 
+from data.embeddings.embedding_cache import EmbeddingCache
+from data.embeddings.embedding_server import RemoteEncoder
+from data.embeddings.model_registry import default_backend, registry
+from data.embeddings.query_batcher import QueryBatcher
+
 # Load environment variables (if needed for other purposes)
 load_dotenv()
 
@@ -9,47 +20,140 @@ load_dotenv()
 class EmbeddingEngine:
     """
     A class that wraps the functionality for generating embeddings using Sentence-Transformers,
-    with the ability to save and load its state.
+    reading through a persistent embedding cache.
     """
 
     def __init__(
         self,
         model_name: str = "all-MiniLM-L6-v2",
-        save_path: str = "embedding_state.json",
+        batch_size: int = 64,
+        cache: Union[EmbeddingCache, bool, None] = None,
+        backend: Optional[str] = None,
+        batch_queries: Optional[bool] = None,
+        server: Optional[str] = None,
     ):
         """
         Initialize the EmbeddingEngine.
 
         Args:
             model_name: The name of the Sentence-Transformers model to use.
-            save_path: The path to the file where the embedding state will be saved/loaded.
+            batch_size: Number of texts encoded per forward pass in get_embeddings.
+            cache: EmbeddingCache to read through. Defaults to a cache shared
+                by all engines of this process (see EMBEDDING_CACHE_DIR);
+                False disables caching.
+            backend: "torch" or "onnx" (int8 ONNX Runtime, see
+                data.embeddings.onnx_backend), defaulting to EMBEDDING_BACKEND.
+            batch_queries: Encode concurrent get_query_embedding calls together
+                through a QueryBatcher. Defaults to on unless
+                EMBEDDING_BATCH_WAIT_MS is 0.
+            server: Address of an embedding server (see
+                data.embeddings.embedding_server) to encode with instead of
+                loading the model, defaulting to EMBEDDING_SERVER; "" loads
+                the model locally.
         """
-        # Initialize the Sentence-Transformer model
-        self.model = SentenceTransformer(model_name)
+        self.backend = backend or default_backend()
         self.model_name = model_name
-        self.corpus = []
-        self.corpus_embeddings = None
-        self.save_path = save_path
+        self.server = os.getenv("EMBEDDING_SERVER", "") if server is None else server
+        self.model = None
+        if self.server:
+            try:
+                self.model = RemoteEncoder(self.server, model_name, self.backend)
+            except httpx.HTTPError as e:
+                print(
+                    f"Embedding server {self.server} unavailable, loading locally: {e}"
+                )
+                self.server = ""
+        if self.model is None:
+            # Shared with every other user of this model in the process
+            self.model = registry.acquire(model_name, self.backend)
+        # Quantized vectors differ slightly, so they get their own cache space
+        self.loaded_backend = getattr(self.model, "backend", "torch")
+        self.cache_name = (
+            model_name
+            if self.loaded_backend == "torch"
+            else f"{model_name}+{self.loaded_backend}"
+        )
+        self.batch_size = batch_size
+        if cache is None:
+            cache = default_cache()
+        self.cache = cache if isinstance(cache, EmbeddingCache) else None
+        self.dim = self.model.get_sentence_embedding_dimension()
+        if batch_queries is None:
+            batch_queries = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", 5)) > 0
+        self.batcher = QueryBatcher(self) if batch_queries else None
 
-    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+    def close(self, unload: bool = False):
         """
-        Generate embeddings for a list of texts.
+        Release the model back to the registry (or close the server client).
+
+        Args:
+            unload: Free the model weights if no other engine holds them.
+        """
+        if self.batcher is not None:
+            self.batcher.close()
+        if isinstance(self.model, RemoteEncoder):
+            self.model.client.close()
+        elif self.model is not None:
+            registry.release(self.model_name, self.backend, unload=unload)
+        self.model = None
+
+    def get_embeddings(
+        self,
+        texts: List[str],
+        batch_size: Optional[int] = None,
+        as_list: bool = False,
+        pool=None,
+    ) -> Union[np.ndarray, List[List[float]]]:
+        """
+        Generate embeddings for a list of texts in batches.
+
+        Texts are sorted by length before batching so each batch pads to a
+        similar length, and the results are written back in input order.
 
         Args:
             texts: A list of text strings.
+            batch_size: Texts per forward pass, defaulting to self.batch_size.
+            as_list: Return a list of lists of floats instead of a matrix, for
+                callers written against the old API.
+            pool: EmbeddingPool that encodes the uncached texts across worker
+                processes, for bulk indexing.
 
         Returns:
-            A list of embeddings (list of floats) corresponding to each text.
+            A contiguous float32 matrix of shape (len(texts), dim), one row
+            per text in input order (or its list view if `as_list`).
         """
-        embeddings = []
-        for text in texts:
-            embedding = self._generate_embedding(text)
-            if embedding is not None:
-                embeddings.append(embedding)
-            else:
-                print(
-                    f"Warning: Embedding generation failed for text: '{text}'. Skipping."
-                )
+        if self.cache is None:
+            embeddings = self._encode(texts, batch_size, pool)
+        else:
+            embeddings, missing = self.cache.get_many(self.cache_name, self.dim, texts)
+            if missing:
+                # Encode each distinct missing text once
+                missing_texts = list(dict.fromkeys(texts[i] for i in missing))
+                encoded = self._encode(missing_texts, batch_size, pool)
+                row_of = {text: row for row, text in enumerate(missing_texts)}
+                embeddings[missing] = encoded[[row_of[texts[i]] for i in missing]]
+                self.cache.put_many(self.cache_name, missing_texts, encoded)
+
+        return embeddings.tolist() if as_list else embeddings
+
+    def _encode(
+        self, texts: List[str], batch_size: Optional[int] = None, pool=None
+    ) -> np.ndarray:
+        """Run the model over texts in length-sorted batches."""
+        if pool is not None:
+            return pool.encode(texts)
+        batch_size = batch_size or self.batch_size
+        embeddings = np.empty((len(texts), self.dim), dtype=np.float32)
+
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), batch_size):
+            indices = order[start : start + batch_size]
+            embeddings[indices] = self.model.encode(
+                [texts[i] for i in indices],
+                batch_size=len(indices),
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
         return embeddings
 
     def get_query_embedding(self, query: str) -> List[float]:
@@ -62,8 +166,24 @@ class EmbeddingEngine:
         Returns:
             The embedding vector of the query.
         """
+        if self.batcher is not None:
+            try:
+                return self.batcher.embed(query)
+            except Exception as e:
+                print(f"Error generating embedding for text: '{query}'. Error: {e}")
+                return []
         return self._generate_embedding(query)
 
+    async def aget_query_embedding(self, query: str) -> List[float]:
+        """Async version of get_query_embedding."""
+        if self.batcher is None:
+            return await asyncio.to_thread(self._generate_embedding, query)
+        try:
+            return await self.batcher.aembed(query)
+        except Exception as e:
+            print(f"Error generating embedding for text: '{query}'. Error: {e}")
+            return []
+
     def _generate_embedding(self, text: str) -> List[float]:
         """
         Generate an embedding using Sentence-Transformers for a given text.
@@ -75,10 +195,48 @@ class EmbeddingEngine:
             A list of floats representing the text's embedding, or None if an error occurs.
         """
         try:
-            # Generate embedding using Sentence-Transformers
-            embedding = self.model.encode(text)
-            # Convert the embedding from a NumPy array to a list of floats
-            return embedding.tolist()
+            # Goes through the cache like the bulk path
+            return self.get_embeddings([text])[0].tolist()
         except Exception as e:
             print(f"Error generating embedding for text: '{text}'. Error: {e}")
             return []
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def default_cache() -> Union[EmbeddingCache, bool]:
+    """
+    Return the process-wide embedding cache, created on first use.
+
+    Returns False when EMBEDDING_CACHE_DIR is set to an empty string or the
+    cache directory cannot be created, so callers fall back to encoding.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            if os.getenv("EMBEDDING_CACHE_DIR") == "":
+                _default_cache = False
+            else:
+                try:
+                    _default_cache = EmbeddingCache()
+                except (OSError, sqlite3.Error) as e:
+                    print(f"Embedding cache disabled: {e}")
+                    _default_cache = False
+        return _default_cache
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(
+    model_name: str = "all-MiniLM-L6-v2", backend: Optional[str] = None
+) -> EmbeddingEngine:
+    """Return the process-wide engine for a model, created on first use."""
+    key = (model_name, backend or default_backend())
+    with _engines_lock:
+        if key not in _engines:
+            _engines[key] = EmbeddingEngine(model_name=model_name, backend=key[1])
+        return _engines[key]
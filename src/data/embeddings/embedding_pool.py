@@ -0,0 +1,153 @@
+"""
+Multi-process encoding for bulk indexing.
+
+A single SentenceTransformer forward pass uses one core well, so encoding a
+large FAQ or HR spreadsheet is spread over a pool of worker processes, each
+holding its own copy of the model. Texts are sorted by length and cut into
+chunks (so each chunk pads to a similar length), chunks are encoded as
+workers free up, and rows are written back in input order.
+
+Workers are started with the spawn method, so scripts using the pool must
+guard their entry point with `if __name__ == "__main__"`.
+"""
+
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+Progress = Callable[[int, int], None]
+
+# Engine of a worker process, created by _init_worker
+_worker_engine = None
+
+
+def _init_worker(model_name: str, backend: str, threads: int):
+    global _worker_engine
+    try:
+        import torch
+
+        # One pool process per core; more threads each only oversubscribe
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from data.embeddings.embedding_engine import EmbeddingEngine
+
+    # The parent reads and writes the cache; workers only encode
+    _worker_engine = EmbeddingEngine(model_name, cache=False, backend=backend)
+
+
+def _encode_chunk(chunk_id: int, texts: List[str], batch_size: int):
+    return chunk_id, _worker_engine.get_embeddings(texts, batch_size=batch_size)
+
+
+def default_workers() -> int:
+    """Worker count from EMBEDDING_WORKERS, defaulting to the number of cores."""
+    return int(os.getenv("EMBEDDING_WORKERS", 0)) or os.cpu_count() or 1
+
+
+def log_progress(done: int, total: int):
+    logger.info(f"Encoded {done}/{total} texts ({100 * done / total:.0f}%)")
+
+
+class EmbeddingPool:
+    """Pool of worker processes encoding texts with one model"""
+
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        workers: Optional[int] = None,
+        chunk_size: int = 512,
+        batch_size: int = 64,
+        backend: Optional[str] = None,
+    ):
+        """
+        Args:
+            model_name: Sentence-Transformers model each worker loads.
+            workers: Worker processes, defaulting to `default_workers()`.
+            chunk_size: Texts sent to a worker at a time.
+            batch_size: Texts per forward pass inside a worker.
+            backend: "torch" or "onnx", defaulting to EMBEDDING_BACKEND.
+        """
+        from data.embeddings.model_registry import default_backend
+
+        self.model_name = model_name
+        self.workers = workers or default_workers()
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.backend = backend or default_backend()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self):
+        """Start the worker processes (done lazily by `encode`)."""
+        if self._executor is None:
+            # spawn: forking a process that already loaded torch is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_name, self.backend, 1),
+            )
+        return self
+
+    def encode(
+        self, texts: List[str], progress: Optional[Progress] = log_progress
+    ) -> np.ndarray:
+        """
+        Encode texts across the pool.
+
+        Args:
+            texts: Texts to encode.
+            progress: Called with (texts done, total) after every chunk.
+
+        Returns:
+            A float32 matrix with one row per text, in input order.
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        self.start()
+        started = time.perf_counter()
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        chunks = [
+            order[start : start + self.chunk_size]
+            for start in range(0, len(order), self.chunk_size)
+        ]
+        futures = [
+            self._executor.submit(
+                _encode_chunk, chunk_id, [texts[i] for i in chunk], self.batch_size
+            )
+            for chunk_id, chunk in enumerate(chunks)
+        ]
+
+        embeddings = None
+        done = 0
+        for future in as_completed(futures):
+            chunk_id, encoded = future.result()
+            if embeddings is None:
+                embeddings = np.empty((len(texts), encoded.shape[1]), np.float32)
+            embeddings[chunks[chunk_id]] = encoded
+            done += len(chunks[chunk_id])
+            if progress is not None:
+                progress(done, len(texts))
+        logger.info(
+            f"Encoded {len(texts)} texts with {self.workers} workers "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+        return embeddings
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,267 @@
+"""
+Local embedding server shared by every app worker.
+
+Each Chainlit worker otherwise loads its own copy of the embedding models.
+With the server running, workers set EMBEDDING_SERVER and their
+`EmbeddingEngine` sends encode requests to it through `RemoteEncoder`
+instead of loading weights; the server holds one copy of each model and
+batches concurrent small requests from all workers into shared forward
+passes (see `QueryBatcher`).
+
+Run it next to the app, on a UNIX socket or a localhost port:
+
+    cd src
+    python -m data.embeddings.embedding_server --uds /tmp/schestudy-embeddings.sock
+    EMBEDDING_SERVER=unix:///tmp/schestudy-embeddings.sock chainlit run ...
+
+    python -m data.embeddings.embedding_server --port 7001
+    EMBEDDING_SERVER=http://127.0.0.1:7001 chainlit run ...
+
+Protocol: `POST /encode` with a JSON body `{"texts": [...], "model": ...,
+"backend": ...}` answers with the raw float32 matrix (row-major) and the
+`X-Embedding-Dim` and `X-Embedding-Backend` headers; `GET /health` returns
+the loaded models and counters as JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import httpx
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Requests with at most this many texts go through the shared query batcher
+BATCHED_REQUEST_MAX_TEXTS = 4
+
+
+class EmbeddingServer:
+    """ASGI application encoding texts with engines loaded once per server"""
+
+    def __init__(self, preload: Sequence[str] = ()):
+        """
+        Args:
+            preload: Model names loaded at startup rather than on first use.
+        """
+        self.preload = list(preload)
+        self._engines: Dict[Tuple[str, str], object] = {}
+        self._lock = threading.Lock()
+        self.metrics = {"requests": 0, "texts": 0, "errors": 0}
+
+    def engine(self, model_name: str, backend: Optional[str] = None):
+        from data.embeddings.embedding_engine import EmbeddingEngine
+        from data.embeddings.model_registry import default_backend
+
+        key = (model_name, backend or default_backend())
+        with self._lock:
+            if key not in self._engines:
+                # server="" so a shared .env never points the server at itself
+                self._engines[key] = EmbeddingEngine(
+                    model_name, backend=key[1], server=""
+                )
+            return self._engines[key]
+
+    async def encode(self, texts: List[str], engine) -> np.ndarray:
+        if not texts:
+            return np.empty((0, engine.dim), dtype=np.float32)
+        if engine.batcher is not None and len(texts) <= BATCHED_REQUEST_MAX_TEXTS:
+            # Queries from different workers share forward passes
+            vectors = await asyncio.gather(*(engine.batcher.aembed(t) for t in texts))
+            return np.asarray(vectors, dtype=np.float32)
+        return await asyncio.to_thread(engine.get_embeddings, texts)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        if scope["method"] == "GET" and scope["path"] == "/health":
+            await self._respond(send, 200, json.dumps(self.stats()).encode())
+            return
+        if scope["method"] != "POST" or scope["path"] != "/encode":
+            await self._respond(send, 404, b'{"error": "not found"}')
+            return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        try:
+            request = json.loads(body)
+            engine = await asyncio.to_thread(
+                self.engine, request["model"], request.get("backend")
+            )
+            embeddings = await self.encode(list(request["texts"]), engine)
+        except Exception as e:
+            self.metrics["errors"] += 1
+            logger.warning(f"Encode request failed: {e}")
+            await self._respond(send, 500, json.dumps({"error": str(e)}).encode())
+            return
+        self.metrics["requests"] += 1
+        self.metrics["texts"] += len(embeddings)
+        headers = [
+            (b"content-type", b"application/octet-stream"),
+            (b"x-embedding-dim", str(engine.dim).encode()),
+            (b"x-embedding-backend", engine.loaded_backend.encode()),
+        ]
+        await self._respond(
+            send, 200, np.ascontiguousarray(embeddings, np.float32).tobytes(), headers
+        )
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                for model_name in self.preload:
+                    await asyncio.to_thread(self.engine, model_name)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for engine in self._engines.values():
+                    engine.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def _respond(send, status: int, body: bytes, headers=None):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": headers or [(b"content-type", b"application/json")],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    def stats(self):
+        return {
+            **self.metrics,
+            "models": {
+                f"{model_name} ({backend})": (
+                    engine.batcher.stats() if engine.batcher is not None else {}
+                )
+                for (model_name, backend), engine in self._engines.items()
+            },
+        }
+
+
+class EmbeddingClient:
+    """Thin synchronous client of an EmbeddingServer"""
+
+    def __init__(self, address: str, timeout: float = 30.0):
+        """
+        Args:
+            address: `unix:///path/to.sock` or `http://127.0.0.1:<port>`.
+            timeout: Seconds before a request fails.
+        """
+        self.address = address
+        if address.startswith("unix://"):
+            transport = httpx.HTTPTransport(uds=address[len("unix://") :])
+            base_url = "http://embedding-server"
+        else:
+            transport = None
+            base_url = address.rstrip("/")
+        # httpx clients are thread-safe and keep the connection alive
+        self.client = httpx.Client(
+            base_url=base_url, transport=transport, timeout=timeout
+        )
+
+    def encode(
+        self, texts: List[str], model_name: str, backend: Optional[str] = None
+    ) -> Tuple[np.ndarray, str]:
+        """Return the embeddings of texts and the backend that produced them."""
+        response = self.client.post(
+            "/encode",
+            json={"texts": list(texts), "model": model_name, "backend": backend},
+        )
+        response.raise_for_status()
+        dim = int(response.headers["x-embedding-dim"])
+        embeddings = np.frombuffer(response.content, dtype=np.float32)
+        return embeddings.reshape(-1, dim), response.headers["x-embedding-backend"]
+
+    def health(self) -> dict:
+        response = self.client.get("/health")
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        self.client.close()
+
+
+class RemoteEncoder:
+    """
+    Stands in for a SentenceTransformer inside EmbeddingEngine, forwarding
+    `encode` calls to the embedding server.
+    """
+
+    def __init__(
+        self,
+        address: Union[str, EmbeddingClient],
+        model_name: str,
+        backend: Optional[str] = None,
+    ):
+        """
+        Raises:
+            httpx.HTTPError: The server is not reachable.
+        """
+        self.client = (
+            address
+            if isinstance(address, EmbeddingClient)
+            else EmbeddingClient(address)
+        )
+        self.model_name = model_name
+        self.requested_backend = backend
+        # An empty request tells us the dimension and the server's backend
+        empty, self.backend = self.client.encode([], model_name, backend)
+        self.dim = empty.shape[1]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(
+        self,
+        sentences: Union[str, Sequence[str]],
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = False,
+        show_progress_bar: bool = False,
+        **kwargs,
+    ) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        embeddings, _ = self.client.encode(
+            texts, self.model_name, self.requested_backend
+        )
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.maximum(norms, 1e-12)
+        return embeddings[0] if single else embeddings
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--uds", help="UNIX socket path (instead of host/port)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7001)
+    parser.add_argument(
+        "--model",
+        action="append",
+        default=[],
+        help="model to load at startup (repeatable)",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    app = EmbeddingServer(preload=args.model or ["all-MiniLM-L6-v2"])
+    if args.uds:
+        uvicorn.run(app, uds=args.uds, lifespan="on")
+    else:
+        uvicorn.run(app, host=args.host, port=args.port, lifespan="on")
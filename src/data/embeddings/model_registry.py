@@ -0,0 +1,208 @@
+"""
+Process-wide registry of loaded SentenceTransformer models.
+
+Each model weight set is loaded at most once per process, on first use, and
+shared by every caller asking for the same name and backend (embedding
+engines, the FAQ and document search tools, the indexer and the semantic
+splitter). Callers `acquire` a model and `release` it when done; a model
+nobody holds stays loaded for the next caller unless it is explicitly
+unloaded.
+"""
+
+import gc
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def load_sentence_transformer(model_name: str):
+    # Imported here so that importing the registry stays cheap
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(model_name)
+
+
+def default_backend() -> str:
+    """Backend named by EMBEDDING_BACKEND: "torch" (default) or "onnx"."""
+    return os.getenv("EMBEDDING_BACKEND", "torch").lower()
+
+
+def load_model(model_name: str, backend: str = "torch"):
+    """
+    Load a model with the given backend.
+
+    The ONNX backend falls back to PyTorch when its extra is missing or
+    the model has not been exported, so enabling it never breaks a worker.
+    """
+    if backend == "onnx":
+        try:
+            from data.embeddings.onnx_backend import load_onnx_encoder
+
+            return load_onnx_encoder(model_name)
+        except (ImportError, FileNotFoundError) as e:
+            logger.warning(f"ONNX backend unavailable for {model_name}: {e}")
+    return load_sentence_transformer(model_name)
+
+
+@dataclass
+class _Entry:
+    model: Any = None
+    refs: int = 0
+    loaded_at: float = 0.0
+    load_seconds: float = 0.0
+    # Held while loading so concurrent first callers wait for a single load
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class ModelRegistry:
+    """Thread-safe, reference-counted cache of loaded models"""
+
+    def __init__(self, loader: Optional[Callable[[str, str], Any]] = None):
+        """
+        Args:
+            loader: Builds a model from its name and backend, defaulting to
+                `load_model`.
+        """
+        self.loader = loader or load_model
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _Entry] = {}
+        self.metrics = {"loads": 0, "reuses": 0, "unloads": 0}
+
+    @staticmethod
+    def _key(model_name: str, backend: str) -> str:
+        return model_name if backend == "torch" else f"{model_name} ({backend})"
+
+    def acquire(self, model_name: str, backend: Optional[str] = None):
+        """
+        Return the model, loading it if this process has not yet.
+
+        Every call must be balanced by `release` once the caller is done.
+
+        Args:
+            model_name: Sentence-Transformers model name.
+            backend: "torch" or "onnx", defaulting to EMBEDDING_BACKEND.
+        """
+        backend = backend or default_backend()
+        key = self._key(model_name, backend)
+        with self._lock:
+            entry = self._entries.setdefault(key, _Entry())
+            entry.refs += 1
+        try:
+            with entry.lock:
+                if entry.model is None:
+                    started = time.perf_counter()
+                    entry.model = self.loader(model_name, backend)
+                    entry.loaded_at = time.time()
+                    entry.load_seconds = time.perf_counter() - started
+                    self.metrics["loads"] += 1
+                    logger.info(f"Loaded model {key} in {entry.load_seconds:.1f}s")
+                else:
+                    self.metrics["reuses"] += 1
+                return entry.model
+        except BaseException:
+            with self._lock:
+                entry.refs -= 1
+                if entry.refs == 0 and entry.model is None:
+                    self._entries.pop(key, None)
+            raise
+
+    def release(
+        self, model_name: str, backend: Optional[str] = None, unload: bool = False
+    ):
+        """
+        Drop one reference to a model.
+
+        Args:
+            model_name: Name passed to `acquire`.
+            backend: Backend passed to `acquire`.
+            unload: Also free the weights if this was the last reference.
+        """
+        key = self._key(model_name, backend or default_backend())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.refs == 0:
+                return
+            entry.refs -= 1
+            if unload and entry.refs == 0:
+                self._drop(key)
+        if unload:
+            gc.collect()
+
+    @contextmanager
+    def use(self, model_name: str, backend: Optional[str] = None):
+        """Hold a model for the duration of a `with` block."""
+        backend = backend or default_backend()
+        model = self.acquire(model_name, backend)
+        try:
+            yield model
+        finally:
+            self.release(model_name, backend)
+
+    def unload(
+        self, model_name: str, backend: Optional[str] = None, force: bool = False
+    ) -> bool:
+        """
+        Free a model's weights.
+
+        Args:
+            model_name: Model to unload.
+            backend: Backend it was loaded with.
+            force: Unload even if callers still hold it; they keep their
+                reference, but the next `acquire` loads a new copy.
+
+        Returns:
+            True if the model was unloaded.
+        """
+        key = self._key(model_name, backend or default_backend())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.model is None or (entry.refs and not force):
+                return False
+            self._drop(key)
+        gc.collect()
+        return True
+
+    def unload_unused(self) -> int:
+        """Unload every model nobody holds and return how many were freed."""
+        with self._lock:
+            unused = [
+                name
+                for name, entry in self._entries.items()
+                if entry.refs == 0 and entry.model is not None
+            ]
+            for name in unused:
+                self._drop(name)
+        if unused:
+            gc.collect()
+        return len(unused)
+
+    def _drop(self, key: str):
+        # Caller holds self._lock
+        entry = self._entries.pop(key)
+        entry.model = None
+        self.metrics["unloads"] += 1
+        logger.info(f"Unloaded model {key}")
+
+    def loaded(self) -> List[str]:
+        with self._lock:
+            return [n for n, e in self._entries.items() if e.model is not None]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return load counters and the reference count of each loaded model."""
+        with self._lock:
+            models = {
+                name: {"refs": entry.refs, "load_seconds": entry.load_seconds}
+                for name, entry in self._entries.items()
+                if entry.model is not None
+            }
+        return {**self.metrics, "models": models}
+
+
+# Shared by every component of the process
+registry = ModelRegistry()
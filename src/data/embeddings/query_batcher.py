@@ -0,0 +1,154 @@
+"""
+Micro-batching of concurrent query embeddings.
+
+Under load many sessions embed a query at the same moment, and one forward
+pass over 16 short queries costs little more than a pass over one. The
+batcher queues query texts from any thread or event loop, waits a few
+milliseconds (or until the batch is full) for more to arrive, encodes them
+in one batch on a dispatcher thread and resolves each caller's future with
+its own vector.
+"""
+
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class QueryBatcher:
+    """Groups concurrent single-text embedding requests into batched encodes"""
+
+    def __init__(
+        self,
+        engine,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+    ):
+        """
+        Args:
+            engine: EmbeddingEngine that encodes the batches.
+            max_batch_size: Texts per batch, defaulting to
+                EMBEDDING_BATCH_MAX_SIZE (32).
+            max_wait_ms: How long the first query of a batch waits for
+                others, defaulting to EMBEDDING_BATCH_WAIT_MS (5).
+        """
+        self.engine = engine
+        self.max_batch_size = max_batch_size or int(
+            os.getenv("EMBEDDING_BATCH_MAX_SIZE", 32)
+        )
+        self.max_wait_ms = (
+            max_wait_ms
+            if max_wait_ms is not None
+            else float(os.getenv("EMBEDDING_BATCH_WAIT_MS", 5))
+        )
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.metrics = {"queries": 0, "batches": 0, "max_batch": 0, "errors": 0}
+
+    def submit(self, text: str) -> Future:
+        """Queue a text and return a future resolving to its embedding."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="query-batcher", daemon=True
+                )
+                self._thread.start()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str) -> List[float]:
+        """Embed one text, blocking until its batch is encoded."""
+        return self.submit(text).result()
+
+    async def aembed(self, text: str) -> List[float]:
+        """Embed one text without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(text))
+
+    def _collect(self, first) -> list:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                item = (
+                    self._queue.get(timeout=timeout)
+                    if timeout > 0
+                    else self._queue.get_nowait()
+                )
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Finish this batch, then stop
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = self._collect(first)
+            batch = [(text, f) for text, f in batch if f.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                vectors = self.engine.get_embeddings([text for text, _ in batch])
+            except Exception as e:
+                self.metrics["errors"] += 1
+                logger.warning(f"Batched embedding of {len(batch)} queries failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector.tolist())
+            self.metrics["queries"] += len(batch)
+            self.metrics["batches"] += 1
+            self.metrics["max_batch"] = max(self.metrics["max_batch"], len(batch))
+
+    def close(self):
+        """Stop the dispatcher thread once queued queries are served."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                self._queue.put(_STOP)
+                self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        stats = dict(self.metrics)
+        batches = stats["batches"]
+        stats["mean_batch"] = stats["queries"] / batches if batches else 0.0
+        return stats
+
+
+if __name__ == "__main__":
+    # Throughput of 256 concurrent queries with and without batching
+    from concurrent.futures import ThreadPoolExecutor
+
+    from data.embeddings.embedding_engine import EmbeddingEngine
+
+    engine = EmbeddingEngine(cache=False)
+    queries = [f"Học phí ngành số {i} là bao nhiêu?" for i in range(256)]
+    batcher = QueryBatcher(engine)
+    for label, embed in (
+        ("unbatched", lambda q: engine.get_embeddings([q])[0]),
+        ("batched", batcher.embed),
+    ):
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            started = time.perf_counter()
+            list(executor.map(embed, queries))
+            elapsed = time.perf_counter() - started
+        print(f"{label:>9}: {len(queries) / elapsed:.0f} queries/s")
+    print(batcher.stats())
+    batcher.close()
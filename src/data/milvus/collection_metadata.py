@@ -0,0 +1,90 @@
+"""
+Embedding configuration recorded with each Milvus collection.
+
+A collection can only be searched with query embeddings from the model that
+indexed it. The indexer records that model, its output dimension and whether
+vectors are L2-normalized as a JSON line at the end of the collection
+description, and `MilvusClient` (hence `faq_tool` and
+`search_relevant_document`) reads it back to embed queries, so switching a
+collection to another model only takes re-indexing it with
+EMBEDDING_MODEL set.
+
+Collections indexed before this existed have no such line; they were built
+with all-MiniLM-L6-v2 and are read as such.
+"""
+
+import json
+import os
+from dataclasses import asdict, dataclass
+from typing import List, Optional
+
+import numpy as np
+
+METADATA_PREFIX = "embedding: "
+LEGACY_MODEL = "all-MiniLM-L6-v2"
+
+
+@dataclass
+class EmbeddingConfig:
+    """Model, dimension and normalization of a collection's dense vectors"""
+
+    model_name: str = LEGACY_MODEL
+    # Model output dimension; None until resolved from the model itself
+    dim: Optional[int] = None
+    normalize: bool = True
+
+    @classmethod
+    def from_env(cls) -> "EmbeddingConfig":
+        """Configuration for new collections, from EMBEDDING_MODEL."""
+        return cls(model_name=os.getenv("EMBEDDING_MODEL", LEGACY_MODEL))
+
+    @property
+    def engine(self):
+        from data.embeddings.embedding_engine import get_engine
+
+        return get_engine(self.model_name)
+
+    def resolve(self) -> "EmbeddingConfig":
+        """Fill in the dimension from the model, loading it if needed."""
+        if self.dim is None:
+            self.dim = self.engine.dim
+        return self
+
+    def embed(self, texts: List[str], pool=None) -> np.ndarray:
+        """Embed texts for indexing, one row per text."""
+        return self.prepare(self.engine.get_embeddings(texts, pool=pool))
+
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a query the way the collection's texts were embedded."""
+        embedding = self.engine.get_query_embedding(query)
+        if not self.normalize or not embedding:
+            return embedding
+        return self.prepare([embedding])[0].tolist()
+
+    def prepare(self, embeddings) -> np.ndarray:
+        """Apply the collection's normalization to embeddings computed elsewhere."""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if not self.normalize:
+            return embeddings
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+
+    def describe(self, description: str) -> str:
+        """Append this configuration to a collection description."""
+        return f"{description}\n{METADATA_PREFIX}{json.dumps(asdict(self.resolve()))}"
+
+    @classmethod
+    def from_description(cls, description: str) -> Optional["EmbeddingConfig"]:
+        for line in reversed((description or "").splitlines()):
+            if line.startswith(METADATA_PREFIX):
+                return cls(**json.loads(line[len(METADATA_PREFIX) :]))
+        return None
+
+    @classmethod
+    def for_collection(cls, collection) -> "EmbeddingConfig":
+        """Configuration recorded with a collection (legacy default if none)."""
+        config = cls.from_description(collection.description)
+        if config is None:
+            # Legacy collections store MiniLM vectors as returned by the model
+            config = cls(model_name=LEGACY_MODEL, dim=384, normalize=False)
+        return config
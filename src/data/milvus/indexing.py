@@ -7,25 +7,49 @@ from pymilvus import (
     FunctionType,
     utility,
 )
-from data.embeddings.embedding_engine import EmbeddingEngine
+from data.embeddings.embedding_pool import EmbeddingPool, default_workers
 import json
 import csv
-from data.milvus.milvus_client import MilvusClient
+from data.milvus.milvus_client import MilvusClient, invalidate_clients
+from data.milvus.collection_metadata import EmbeddingConfig
+from data.milvus.vector_storage import VectorStorage, projection_collection
 import logging
+import numpy as np
 import pandas as pd
 
 # Setup logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Below this many texts, starting worker processes costs more than it saves
+PARALLEL_MIN_TEXTS = 2000
+
 
 class MilvusIndexer:
     def __init__(
         self,
         collection_name="summerschool_workshop",
         faq_file="src/data/mock_data/admission_faq_large.csv",
+        workers=None,
+        vector_storage=None,
+        embedding_config=None,
     ):
+        """
+        Args:
+            collection_name: Milvus collection to create and fill.
+            faq_file: CSV or Excel file to index.
+            workers: Processes encoding large files, defaulting to
+                EMBEDDING_WORKERS or the number of cores; 1 encodes in process.
+            vector_storage: VectorStorage layout of the dense fields (float16,
+                truncation or PCA), defaulting to VECTOR_DTYPE/VECTOR_DIM.
+            embedding_config: EmbeddingConfig (model and normalization)
+                recorded with the collection, defaulting to EMBEDDING_MODEL.
+        """
         self.collection_name = collection_name
+        self.workers = workers or default_workers()
+        self.embedding_config = embedding_config or EmbeddingConfig.from_env()
+        # Resolved in create_collection, once the model dimension is known
+        self.vector_storage = vector_storage
         self.faq_file = faq_file
         self.file_type = "csv" if faq_file.endswith(".csv") else "xlsx"
         self.milvus_client = MilvusClient()
@@ -59,6 +83,15 @@ class MilvusIndexer:
         if utility.has_collection(self.collection_name):
             utility.drop_collection(self.collection_name)
             logger.info(f"Dropped existing collection '{self.collection_name}'")
+        if utility.has_collection(projection_collection(self.collection_name)):
+            utility.drop_collection(projection_collection(self.collection_name))
+        # Shared clients in this process cached the old schema and metadata
+        invalidate_clients(self.collection_name)
+
+        # The dense field dimension comes from the embedding model
+        config = self.embedding_config.resolve()
+        if self.vector_storage is None:
+            self.vector_storage = VectorStorage.from_env(source_dim=config.dim)
 
         # Create dynamic fields
         fields = [
@@ -74,11 +107,7 @@ class MilvusIndexer:
                         max_length=65535,
                         enable_analyzer=True,
                     ),
-                    FieldSchema(
-                        name=f"{category}_dense_embedding",
-                        dtype=DataType.FLOAT_VECTOR,
-                        dim=384,
-                    ),
+                    self.vector_storage.field(f"{category}_dense_embedding"),
                     FieldSchema(
                         name=f"{category}_sparse_embedding",
                         dtype=DataType.SPARSE_FLOAT_VECTOR,
@@ -99,7 +128,7 @@ class MilvusIndexer:
 
         schema = CollectionSchema(
             fields,
-            description=f"Dynamic Milvus Collection for {categories}",
+            description=config.describe(f"Dynamic Milvus Collection for {categories}"),
             enable_analyzers=True,
         )
 
@@ -153,18 +182,27 @@ class MilvusIndexer:
             return [], []
 
         categories = list(data[0].keys())
-        embedding_engine = EmbeddingEngine(model_name="all-MiniLM-L6-v2")
-
-        category_texts = {}
-        category_embeddings = {}
-
-        # Generate embeddings for each category
-        for category in categories:
-            texts = [item.get(category, "") for item in data]
-            embeddings = embedding_engine.get_embeddings(texts)
-            category_texts[category] = texts
-            category_embeddings[category] = embeddings
 
+        category_texts = {
+            category: [item.get(category, "") for item in data]
+            for category in categories
+        }
+        # Encode all categories in one call so large files keep every worker busy
+        texts = [text for category in categories for text in category_texts[category]]
+        pool = None
+        if self.workers > 1 and len(texts) >= PARALLEL_MIN_TEXTS:
+            pool = EmbeddingPool(self.embedding_config.model_name, workers=self.workers)
+        try:
+            # float32 matrix, one row per text, normalized as the collection records
+            embeddings = self.embedding_config.embed(texts, pool=pool)
+        finally:
+            if pool is not None:
+                pool.close()
+
+        category_embeddings = {
+            category: embeddings[i * len(data) : (i + 1) * len(data)]
+            for i, category in enumerate(categories)
+        }
         return category_texts, category_embeddings
 
     def insert_data(self, data):
@@ -175,6 +213,16 @@ class MilvusIndexer:
             )
 
         category_texts, category_embeddings = self.generate_embeddings(data)
+        if isinstance(category_embeddings, dict):
+            storage = self.vector_storage
+            if storage.needs_fit:
+                storage.fit(np.vstack(list(category_embeddings.values())))
+                storage.save(self.collection_name)
+                logger.info(f"Fitted PCA projection to {storage.dim} dims")
+            category_embeddings = {
+                category: storage.to_milvus(embeddings)
+                for category, embeddings in category_embeddings.items()
+            }
 
         if isinstance(category_texts, dict):
             categories = list(category_texts.keys())
@@ -196,7 +244,7 @@ class MilvusIndexer:
         logger.info(f"Entity arrays: {len(entities)}")
         for i, entity in enumerate(entities):
             logger.info(
-                f"Entity {i}: {type(entity[0]) if entity else 'empty'} - length {len(entity)}"
+                f"Entity {i}: {type(entity[0]) if len(entity) else 'empty'} - length {len(entity)}"
             )
 
         insert_result = self.collection.insert(entities)
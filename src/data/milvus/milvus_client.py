@@ -7,23 +7,58 @@ from pymilvus import (
     utility,
 )
 from pymilvus import AnnSearchRequest, WeightedRanker
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional, Tuple, TypeVar
+import threading
+import time
 import traceback
 import os
 
+from data.milvus.collection_metadata import EmbeddingConfig
+from data.milvus.vector_storage import DENSE_VECTOR_TYPES, VectorStorage
+
+T = TypeVar("T")
+
 
 class MilvusClient:
-    def __init__(self, collection_name: str = "summerschool_workshop"):
+    def __init__(
+        self,
+        collection_name: str = "summerschool_workshop",
+        vector_storage: Optional[VectorStorage] = None,
+        embedding_config: Optional[EmbeddingConfig] = None,
+    ):
+        """
+        Args:
+            collection_name: Collection to search and index.
+            vector_storage: Dense vector layout used if the collection has to
+                be created, defaulting to VECTOR_DTYPE/VECTOR_DIM.
+            embedding_config: Embedding model used if the collection has to
+                be created, defaulting to EMBEDDING_MODEL.
+
+        Existing collections always use the model and layout recorded when
+        they were created.
+        """
         self.collection_name = collection_name
+        self.uri = os.getenv("MILVUS_URI")
+        self.embedding_config = embedding_config or EmbeddingConfig.from_env()
+        self.vector_storage = vector_storage
+        # Cleared when a search fails, so get_client replaces this client
+        self.healthy = True
+        self.last_used = time.monotonic()
+        self._loaded = False
         self._connect()
-        self._ensure_collection_exists()
+        created = self._ensure_collection_exists()
         self.collection = Collection(self.collection_name)
+        if not created:
+            self.embedding_config = EmbeddingConfig.for_collection(self.collection)
+            self.vector_storage = VectorStorage.for_collection(
+                self.collection, self.embedding_config.dim
+            )
 
     def _connect(self):
         try:
             connections.connect(
                 alias="default",
-                uri=os.getenv("MILVUS_URI"),
+                uri=self.uri,
                 token=f"{os.getenv('MILVUS_TOKEN')}",
             )
             # Verify connection
@@ -39,9 +74,37 @@ class MilvusClient:
             print("Connection to Milvus is not active. Reconnecting...")
             self._connect()
 
-    def _ensure_collection_exists(self):
+    def ping(self) -> bool:
+        """Check the server answers on this client's connection (one round trip)."""
+        try:
+            utility.get_server_version()
+            return True
+        except Exception as e:
+            print(f"Milvus health check failed: {e}")
+            return False
+
+    def _ensure_loaded(self) -> bool:
+        """Load the collection into memory once; False if it cannot be loaded."""
+        if self._loaded:
+            return True
+        try:
+            self.collection.load()
+            self._loaded = True
+            print("Collection loaded successfully")
+        except Exception as e:
+            print(f"Error loading collection: {str(e)}")
+            self.healthy = False
+        return self._loaded
+
+    def _ensure_collection_exists(self) -> bool:
+        """Create the FAQ collection if missing; True if it was created."""
         if not utility.has_collection(self.collection_name):
             print(f"Collection '{self.collection_name}' does not exist. Creating it...")
+            # The schema dimension comes from the embedding model
+            config = self.embedding_config.resolve()
+            if self.vector_storage is None:
+                self.vector_storage = VectorStorage.from_env(source_dim=config.dim)
+            storage = self.vector_storage
             schema = CollectionSchema(
                 fields=[
                     FieldSchema(
@@ -53,28 +116,26 @@ class MilvusClient:
                     FieldSchema(
                         name="Answer", dtype=DataType.VARCHAR, max_length=65535
                     ),
-                    FieldSchema(
-                        name="Question_dense_embedding",
-                        dtype=DataType.FLOAT_VECTOR,
-                        dim=384,
-                    ),
+                    storage.field("Question_dense_embedding"),
                     FieldSchema(
                         name="Question_sparse_embedding",
                         dtype=DataType.SPARSE_FLOAT_VECTOR,
                     ),
-                    FieldSchema(
-                        name="Answer_dense_embedding",
-                        dtype=DataType.FLOAT_VECTOR,
-                        dim=384,
-                    ),
+                    storage.field("Answer_dense_embedding"),
                     FieldSchema(
                         name="Answer_sparse_embedding",
                         dtype=DataType.SPARSE_FLOAT_VECTOR,
                     ),
                 ],
-                description="FAQ collection schema",
+                description=config.describe("FAQ collection schema"),
             )
             Collection(name=self.collection_name, schema=schema)
+            return True
+        return False
+
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a query with the model this collection was indexed with."""
+        return self.embedding_config.embed_query(query)
 
     def index_data(
         self,
@@ -100,19 +161,27 @@ class MilvusClient:
         self._ensure_connection()
 
         try:
+            storage = self.vector_storage
+            question_vectors = self.embedding_config.prepare(Question_embeddings)
+            answer_vectors = self.embedding_config.prepare(Answer_embeddings)
+            if storage.needs_fit:
+                # Fit the PCA projection on this first batch and keep it
+                storage.fit(list(question_vectors) + list(answer_vectors))
+                storage.save(self.collection_name)
+
             # Prepare the data to be inserted into Milvus
             entities = [
                 {"name": "Question", "values": Questions, "type": DataType.VARCHAR},
                 {"name": "Answer", "values": Answers, "type": DataType.VARCHAR},
                 {
                     "name": "Question_dense_embedding",
-                    "values": Question_embeddings,
-                    "type": DataType.FLOAT_VECTOR,
+                    "values": storage.to_milvus(question_vectors),
+                    "type": storage.milvus_dtype,
                 },
                 {
                     "name": "Answer_dense_embedding",
-                    "values": Answer_embeddings,
-                    "type": DataType.FLOAT_VECTOR,
+                    "values": storage.to_milvus(answer_vectors),
+                    "type": storage.milvus_dtype,
                 },
             ]
 
@@ -206,13 +275,7 @@ class MilvusClient:
         """
         # Ensure connection before proceeding
         self._ensure_connection()
-
-        try:
-            # Load collection into memory
-            self.collection.load()
-            print("Collection loaded successfully")
-        except Exception as e:
-            print(f"Error loading collection: {str(e)}")
+        if not self._ensure_loaded():
             return []
 
         # Define search fields based on whether we're searching Answers or Questions
@@ -225,6 +288,8 @@ class MilvusClient:
 
         # Parameters for dense vector search
         dense_search_params = {"metric_type": "L2", "params": {"nprobe": 10}}
+        # Reduced/cast the same way as the stored vectors
+        query_vector = self.vector_storage.project_query(query_dense_embedding)
 
         # Parameters for sparse vector search (BM25)
         sparse_search_params = {"metric_type": "BM25", "params": {}}
@@ -234,7 +299,7 @@ class MilvusClient:
 
             # For dense vector search (semantic similarity)
             search_param_1 = {
-                "data": [query_dense_embedding],  # List containing the embedding vector
+                "data": [query_vector],  # List containing the projected embedding
                 "anns_field": dense_field,  # Use the correct field based on search_answers
                 "param": dense_search_params,
                 "limit": limit * 2,  # Get more results for reranking
@@ -289,7 +354,7 @@ class MilvusClient:
             try:
                 print("Falling back to simple vector search")
                 search_results = self.collection.search(
-                    data=[query_dense_embedding],
+                    data=[query_vector],
                     anns_field=dense_field,
                     param=dense_search_params,
                     limit=limit,
@@ -309,6 +374,7 @@ class MilvusClient:
             except Exception as e3:
                 print(f"All search methods failed: {str(e3)}")
                 traceback.print_exc()
+                self.healthy = False
                 return []
 
     def generic_hybrid_search(
@@ -342,10 +408,7 @@ class MilvusClient:
             A list of result dictionaries, each containing the output fields and a combined score.
         """
         self._ensure_connection()
-        try:
-            self.collection.load()
-        except Exception as e:
-            print(f"Error loading collection: {e}")
+        if not self._ensure_loaded():
             return []
 
         # --- 1. Discover Fields if Not Provided ---
@@ -380,12 +443,13 @@ class MilvusClient:
         ranker_weights = []
         dense_params = {"metric_type": "L2", "params": {"nprobe": 10}}
         sparse_params = {"metric_type": "BM25", "params": {}}  # BM25 uses text query
+        query_vector = self.vector_storage.project_query(query_dense_embedding)
 
         for field in fields_to_search:
             # Dense request
             search_requests.append(
                 AnnSearchRequest(
-                    data=[query_dense_embedding],
+                    data=[query_vector],
                     anns_field=f"{field}_dense_embedding",
                     param=dense_params,
                     limit=limit * 2,
@@ -409,7 +473,7 @@ class MilvusClient:
             output_fields = [
                 f.name
                 for f in self.collection.schema.fields
-                if f.dtype not in [DataType.FLOAT_VECTOR, DataType.SPARSE_FLOAT_VECTOR]
+                if f.dtype not in [*DENSE_VECTOR_TYPES, DataType.SPARSE_FLOAT_VECTOR]
             ]
 
         # --- 4. Execute Search ---
@@ -442,7 +506,7 @@ class MilvusClient:
             try:
                 first_dense_field = f"{fields_to_search[0]}_dense_embedding"
                 fallback_results = self.collection.search(
-                    data=[query_dense_embedding],
+                    data=[query_vector],
                     anns_field=first_dense_field,
                     param=dense_params,
                     limit=limit,
@@ -459,4 +523,91 @@ class MilvusClient:
             except Exception as fallback_e:
                 print(f"Fallback search also failed: {fallback_e}")
                 traceback.print_exc()
+                self.healthy = False
                 return []
+
+
+# Process-wide clients, keyed by (MILVUS_URI, collection name)
+_clients: Dict[Tuple[Optional[str], str], MilvusClient] = {}
+# Guards the dicts only; clients are built under their key's lock
+_clients_lock = threading.Lock()
+_build_locks: Dict[Tuple[Optional[str], str], threading.Lock] = {}
+
+
+def _usable(client: Optional[MilvusClient], interval: float) -> bool:
+    """True if a cached client can be used without being replaced."""
+    if client is None or not client.healthy:
+        return False
+    if interval and time.monotonic() - client.last_used > interval:
+        client.healthy = client.ping()
+    return client.healthy
+
+
+def get_client(collection_name: str = "summerschool_workshop") -> MilvusClient:
+    """
+    Shared client of a collection, created on first use.
+
+    Creating a client connects and reads the collection schema and metadata;
+    a cached client makes no round trips before the search itself. A client
+    whose last search failed is replaced by a new one, and one idle for more
+    than MILVUS_HEALTH_CHECK_SECONDS (60; 0 disables) is pinged first.
+
+    Clients are built outside the process-wide lock, so a slow or unreachable
+    Milvus only holds up callers of the collection being (re)connected.
+
+    Args:
+        collection_name: Collection to search.
+
+    Returns:
+        The MilvusClient of this collection on the current MILVUS_URI.
+    """
+    uri = os.getenv("MILVUS_URI")
+    key = (uri, collection_name)
+    interval = float(os.getenv("MILVUS_HEALTH_CHECK_SECONDS", 60))
+    with _clients_lock:
+        stale = [k for k in _clients if k[0] != uri]
+        if stale:
+            # All clients share the "default" alias, which points at one URI
+            for k in stale:
+                del _clients[k]
+            connections.disconnect("default")
+        client = _clients.get(key)
+        build_lock = _build_locks.setdefault(key, threading.Lock())
+
+    if not _usable(client, interval):
+        with build_lock:
+            # Another thread may have replaced it while we waited
+            with _clients_lock:
+                current = _clients.get(key)
+            if current is not client and _usable(current, interval):
+                client = current
+            else:
+                if client is not None:
+                    print(f"Reconnecting Milvus client for '{collection_name}'...")
+                    if not client.ping():
+                        connections.disconnect("default")
+                client = MilvusClient(collection_name=collection_name)
+                with _clients_lock:
+                    _clients[key] = client
+    client.last_used = time.monotonic()
+    return client
+
+
+def with_client(collection_name: str, operation: Callable[[MilvusClient], T]) -> T:
+    """
+    Run operation with the shared client of a collection, and run it once more
+    on a reconnected client if it failed (e.g. after a Milvus restart or a
+    re-index of the collection).
+    """
+    client = get_client(collection_name)
+    result = operation(client)
+    if client.healthy:
+        return result
+    return operation(get_client(collection_name))
+
+
+def invalidate_clients(collection_name: Optional[str] = None):
+    """Forget the shared clients of a collection (all if None)."""
+    with _clients_lock:
+        for key in [k for k in _clients if collection_name in (None, k[1])]:
+            del _clients[key]
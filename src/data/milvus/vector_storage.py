@@ -0,0 +1,260 @@
+"""
+Compact storage of dense vectors in Milvus collections.
+
+A 384-dimensional float32 vector takes 1.5 KB in Milvus memory. Collections
+can instead store:
+
+- float16 vectors (`FLOAT16_VECTOR`), halving memory at almost no recall cost;
+- fewer dimensions, either the first `dim` components ("truncate") or a PCA
+  projection fitted on the embeddings at index time ("pca").
+
+Reduced vectors are re-normalized, so L2 distances keep ranking like cosine
+similarity. The dtype and stored dimension are read back from the
+collection schema; a PCA projection is kept next to the collection in
+`<collection>__projection` (row 0 the mean, then one row per component), so
+every app node projects query embeddings exactly like the indexer did.
+"""
+
+import argparse
+import os
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, utility
+
+DTYPES = {"float32": DataType.FLOAT_VECTOR, "float16": DataType.FLOAT16_VECTOR}
+# Dense vector field types, as stored or returned by Milvus
+DENSE_VECTOR_TYPES = (DataType.FLOAT_VECTOR, DataType.FLOAT16_VECTOR)
+
+
+def projection_collection(collection_name: str) -> str:
+    return f"{collection_name}__projection"
+
+
+@dataclass
+class VectorStorage:
+    """How a collection stores dense vectors, and the matching projection"""
+
+    dtype: str = "float32"
+    dim: int = 384
+    reduction: str = "none"
+    source_dim: int = 384
+    mean: Optional[np.ndarray] = None
+    components: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_env(cls, source_dim: int = 384) -> "VectorStorage":
+        """
+        Storage configured by VECTOR_DTYPE (float32 or float16), VECTOR_DIM
+        (0 keeps the model dimension) and VECTOR_REDUCTION (truncate or pca).
+        """
+        dim = int(os.getenv("VECTOR_DIM", 0)) or source_dim
+        return cls(
+            dtype=os.getenv("VECTOR_DTYPE", "float32"),
+            dim=dim,
+            reduction=(
+                os.getenv("VECTOR_REDUCTION", "truncate")
+                if dim < source_dim
+                else "none"
+            ),
+            source_dim=source_dim,
+        )
+
+    def __post_init__(self):
+        if self.dtype not in DTYPES:
+            raise ValueError(f"Unsupported vector dtype {self.dtype}")
+        if self.reduction not in ("none", "truncate", "pca"):
+            raise ValueError(f"Unsupported reduction {self.reduction}")
+        if self.dim > self.source_dim:
+            raise ValueError(f"Cannot store {self.dim} of {self.source_dim} dims")
+
+    @property
+    def milvus_dtype(self) -> DataType:
+        return DTYPES[self.dtype]
+
+    @property
+    def bytes_per_vector(self) -> int:
+        return self.dim * (2 if self.dtype == "float16" else 4)
+
+    @property
+    def needs_fit(self) -> bool:
+        return self.reduction == "pca" and self.components is None
+
+    def field(self, name: str) -> FieldSchema:
+        """Schema of a dense vector field stored this way."""
+        return FieldSchema(name=name, dtype=self.milvus_dtype, dim=self.dim)
+
+    def fit(self, embeddings: np.ndarray):
+        """Fit the PCA projection on (a sample of) the embeddings being indexed."""
+        if self.reduction != "pca":
+            return
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if len(embeddings) < self.dim:
+            raise ValueError(
+                f"PCA to {self.dim} dims needs at least {self.dim} embeddings, "
+                f"got {len(embeddings)}"
+            )
+        self.mean = embeddings.mean(axis=0)
+        # Rows of vt are the principal axes, by decreasing variance
+        _, _, vt = np.linalg.svd(embeddings - self.mean, full_matrices=False)
+        self.components = vt[: self.dim].astype(np.float32)
+
+    def project(self, embeddings) -> np.ndarray:
+        """Reduce and cast embeddings (one per row) to the stored form."""
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if self.reduction == "pca":
+            if self.components is None:
+                raise RuntimeError("PCA projection is not fitted")
+            embeddings = (embeddings - self.mean) @ self.components.T
+        elif self.reduction == "truncate" or embeddings.shape[1] > self.dim:
+            embeddings = embeddings[:, : self.dim]
+        if self.reduction != "none":
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.maximum(norms, 1e-12)
+        return embeddings.astype(np.float16 if self.dtype == "float16" else np.float32)
+
+    def to_milvus(self, embeddings) -> List[np.ndarray]:
+        """Rows ready to insert into a field created by `field`."""
+        return list(self.project(embeddings))
+
+    def project_query(self, embedding: List[float]) -> np.ndarray:
+        """Project a query embedding the way the collection's vectors were."""
+        return self.project([embedding])[0]
+
+    def save(self, collection_name: str):
+        """Store the PCA projection next to the collection (or drop a stale one)."""
+        name = projection_collection(collection_name)
+        if utility.has_collection(name):
+            utility.drop_collection(name)
+        if self.reduction != "pca":
+            return
+        schema = CollectionSchema(
+            [
+                FieldSchema(name="ID", dtype=DataType.INT64, is_primary=True),
+                FieldSchema(
+                    name="vector", dtype=DataType.FLOAT_VECTOR, dim=self.source_dim
+                ),
+            ],
+            description=f"PCA projection of {collection_name} to {self.dim} dims",
+        )
+        collection = Collection(name=name, schema=schema)
+        rows = np.vstack([self.mean[None, :], self.components])
+        collection.insert([list(range(len(rows))), rows.tolist()])
+        collection.flush()
+        collection.create_index(
+            field_name="vector",
+            index_params={"index_type": "FLAT", "metric_type": "L2"},
+        )
+
+    @classmethod
+    def for_collection(
+        cls, collection: Collection, source_dim: Optional[int] = None
+    ) -> "VectorStorage":
+        """
+        Read the storage of an existing collection from its schema.
+
+        Args:
+            collection: Collection to inspect.
+            source_dim: Dimension of the model that indexed it (see
+                EmbeddingConfig), defaulting to 384.
+        """
+        source_dim = source_dim or 384
+        field = next(
+            (f for f in collection.schema.fields if f.dtype in DENSE_VECTOR_TYPES),
+            None,
+        )
+        if field is None:
+            return cls(dim=source_dim, source_dim=source_dim)
+        dtype = "float16" if field.dtype == DataType.FLOAT16_VECTOR else "float32"
+        dim = int(field.params["dim"])
+
+        name = projection_collection(collection.name)
+        if utility.has_collection(name):
+            projection = Collection(name)
+            projection.load()
+            rows = projection.query(
+                expr="ID >= 0", output_fields=["ID", "vector"], limit=dim + 1
+            )
+            rows.sort(key=lambda row: row["ID"])
+            vectors = np.asarray([row["vector"] for row in rows], dtype=np.float32)
+            return cls(
+                dtype=dtype,
+                dim=dim,
+                reduction="pca",
+                source_dim=vectors.shape[1],
+                mean=vectors[0],
+                components=vectors[1:],
+            )
+        # Without a projection, fewer dimensions than the model means truncation
+        return cls(
+            dtype=dtype,
+            dim=dim,
+            reduction="truncate" if dim < source_dim else "none",
+            source_dim=max(dim, source_dim),
+        )
+
+
+def recall_at_k(reference: np.ndarray, candidate: np.ndarray, k: int = 10) -> float:
+    """Mean overlap of the k nearest neighbours of every row under both encodings."""
+
+    def neighbours(vectors):
+        vectors = vectors.astype(np.float32)
+        squared = (vectors**2).sum(axis=1)
+        distances = squared[:, None] + squared[None, :] - 2 * vectors @ vectors.T
+        np.fill_diagonal(distances, np.inf)
+        return np.argsort(distances, axis=1)[:, :k]
+
+    k = min(k, len(reference) - 1)
+    overlap = [
+        len(set(a) & set(b)) / k
+        for a, b in zip(neighbours(reference), neighbours(candidate))
+    ]
+    return float(np.mean(overlap))
+
+
+def benchmark(embeddings: np.ndarray, k: int = 10):
+    """Print memory per vector and recall@k against float32 for each layout."""
+    source_dim = embeddings.shape[1]
+    layouts = [("float32", source_dim, "none"), ("float16", source_dim, "none")]
+    for dim in (256, 128, 64):
+        if dim < source_dim:
+            for reduction in ("truncate", "pca"):
+                for dtype in ("float32", "float16"):
+                    layouts.append((dtype, dim, reduction))
+
+    print(f"{len(embeddings)} vectors of {source_dim} dims, recall@{k} vs float32")
+    for dtype, dim, reduction in layouts:
+        storage = VectorStorage(dtype, dim, reduction, source_dim)
+        if storage.needs_fit:
+            if len(embeddings) < dim:
+                continue
+            storage.fit(embeddings)
+        stored = storage.project(embeddings)
+        print(
+            f"{dtype:>8} {dim:>4} {reduction:>8}: {storage.bytes_per_vector:>5} B/vector "
+            f"({storage.bytes_per_vector * 1_000_000 / 2**20:>6.0f} MiB per 1M), "
+            f"recall {recall_at_k(embeddings, stored, k):.3f}"
+        )
+
+
+if __name__ == "__main__":
+    import csv
+
+    from data.embeddings.embedding_engine import get_engine
+
+    parser = argparse.ArgumentParser(
+        description="Memory/recall trade-off of compact vector layouts"
+    )
+    parser.add_argument(
+        "texts", help="CSV (every non-empty cell) or text file (one per line)"
+    )
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    with open(args.texts, encoding="utf-8") as f:
+        if args.texts.endswith(".csv"):
+            texts = [cell for row in csv.reader(f) for cell in row if cell.strip()]
+        else:
+            texts = [line.strip() for line in f if line.strip()]
+    benchmark(get_engine().get_embeddings(texts), k=args.k)
@@ -4,6 +4,12 @@ from pydantic_ai.models.gemini import GeminiModel
 from pydantic_ai.providers.google_gla import GoogleGLAProvider
 import os
 
+from llm.context import Priority
+from llm.prompt_cache import PromptPrefixCache
+from llm.rate_limit import DEFAULT_RATE_LIMITER, RateLimitedModel, RedisRateLimiter
+from llm.retry import DEFAULT_RETRY_POLICY, RetryingModel, RetryPolicy
+from llm.scheduler import DEFAULT_SCHEDULER, FairScheduler, ScheduledModel
+
 provider = GoogleGLAProvider(api_key=os.getenv("GEMINI_API_KEY"))
 model = GeminiModel("gemini-2.0-flash", provider=provider)
 
@@ -14,15 +20,45 @@ class AgentClient:
         system_prompt: str,
         tools: Optional[List[Callable]] = None,
         model: GeminiModel = model,
+        prompt_cache: Optional[PromptPrefixCache] = None,
+        retry_policy: Optional[RetryPolicy] = DEFAULT_RETRY_POLICY,
+        rate_limiter: Optional[RedisRateLimiter] = DEFAULT_RATE_LIMITER,
+        name: Optional[str] = None,
+        scheduler: Optional[FairScheduler] = DEFAULT_SCHEDULER,
+        priority: Optional[Priority] = None,
     ):
         self.model = model
         self.system_prompt = system_prompt
         self.tools = tools
+        self.prompt_cache = prompt_cache
+        self.retry_policy = retry_policy
+        self.rate_limiter = rate_limiter
+        self.name = name
+        self.scheduler = scheduler
+        self.priority = priority
 
     def create_agent(self):
         """Creates and returns a PydanticAI Agent instance."""
         return Agent(
-            model=self.model,
+            model=self._resolve_model(),
+            name=self.name,
             system_prompt=self.system_prompt,
             tools=self.tools if self.tools is not None else [],
         )
+
+    def _resolve_model(self):
+        """Wrap the model with the configured cache, scheduler, limiter and retries."""
+        resolved = self.model
+        if self.prompt_cache is not None and hasattr(resolved, "client"):
+            resolved = self.prompt_cache.wrap_model(resolved)
+        if self.scheduler is not None:
+            # Innermost, so a slot is only held while the request is in flight
+            resolved = ScheduledModel(resolved, self.scheduler, priority=self.priority)
+        if self.rate_limiter is not None:
+            # Inside the retry wrapper, so every attempt takes its own token
+            resolved = RateLimitedModel(
+                resolved, self.rate_limiter, agent_name=self.name or "agent"
+            )
+        if self.retry_policy is not None:
+            resolved = RetryingModel(resolved, self.retry_policy)
+        return resolved
@@ -0,0 +1,28 @@
+"""
+Per-turn context for LLM calls.
+
+Chat handlers set these variables at the start of a turn; model wrappers read
+them to attribute each request to a user session and a priority lane. Context
+variables follow asyncio tasks, so concurrent sessions do not see each other's
+values.
+"""
+
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Optional
+
+
+class Priority(IntEnum):
+    """Scheduling lanes, served in ascending order."""
+
+    INTERACTIVE = 0
+    BACKGROUND = 1
+    INDEXING = 2
+
+
+current_llm_user: ContextVar[Optional[str]] = ContextVar(
+    "current_llm_user", default=None
+)
+current_llm_priority: ContextVar[Priority] = ContextVar(
+    "current_llm_priority", default=Priority.INTERACTIVE
+)
@@ -0,0 +1,422 @@
+"""
+Prompt prefix caching for LLM agents.
+
+Every agent request resends the same static prefix (system prompt, tool
+declarations and tool config). Providers that support explicit context
+caching can store that prefix once and let later requests reference it by
+name, which lowers input-token cost and latency per call.
+
+`PromptPrefixCache` owns the cache entries (one per model and prompt version),
+refreshes them before they expire and falls back to the original request
+whenever the provider cannot serve a cached prefix. `PrefixCacheTransport`
+plugs it into the HTTP client of a pydantic-ai model, so agents do not need to
+know whether caching is active.
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+GEMINI_API_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+
+
+@dataclass
+class CachedPrefix:
+    """A prefix stored on the provider side."""
+
+    name: str
+    model_name: str
+    prefix_hash: str
+    expires_at: float
+
+
+class PromptCacheProvider:
+    """
+    Interface for providers that can cache a static request prefix.
+
+    The default request handling follows the Gemini `generateContent` body:
+    the fields listed in `prefix_fields` are moved into the cached content and
+    replaced by a reference stored under `handle_field`.
+    """
+
+    prefix_fields: Tuple[str, ...] = ("systemInstruction", "tools", "toolConfig")
+    handle_field: str = "cachedContent"
+    # Providers reject prefixes below a minimum token count, skip obvious misses
+    min_prefix_chars: int = 0
+
+    async def create(
+        self, model_name: str, prefix: Dict[str, Any], ttl_seconds: int
+    ) -> CachedPrefix:
+        """Store `prefix` for `model_name` and return the provider handle."""
+        raise NotImplementedError
+
+    async def refresh(self, entry: CachedPrefix, ttl_seconds: int) -> CachedPrefix:
+        """Extend the lifetime of an existing entry."""
+        raise NotImplementedError
+
+    async def delete(self, entry: CachedPrefix) -> None:
+        """Remove an entry from the provider."""
+        raise NotImplementedError
+
+    def extract_prefix(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Return the cacheable part of a request payload.
+
+        Returns:
+            The prefix fields present in the payload, or None if the request
+            carries no system instruction or already references a cache.
+        """
+        if self.handle_field in payload or "systemInstruction" not in payload:
+            return None
+        prefix = {k: payload[k] for k in self.prefix_fields if k in payload}
+        if len(json.dumps(prefix, ensure_ascii=False)) < self.min_prefix_chars:
+            return None
+        return prefix
+
+    def attach(self, payload: Dict[str, Any], entry: CachedPrefix) -> Dict[str, Any]:
+        """Return a copy of `payload` that references `entry` instead of the prefix."""
+        rewritten = {k: v for k, v in payload.items() if k not in self.prefix_fields}
+        rewritten[self.handle_field] = entry.name
+        return rewritten
+
+
+class GeminiPromptCacheProvider(PromptCacheProvider):
+    """Explicit context caching through the Gemini `cachedContents` REST API."""
+
+    # Gemini requires roughly 1k-4k tokens before a prefix can be cached
+    min_prefix_chars = 4000
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        base_url: str = GEMINI_API_BASE_URL,
+        timeout: float = 30.0,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.client = httpx.AsyncClient(
+            headers={"X-Goog-Api-Key": api_key or ""}, timeout=timeout
+        )
+
+    async def create(
+        self, model_name: str, prefix: Dict[str, Any], ttl_seconds: int
+    ) -> CachedPrefix:
+        body = dict(prefix)
+        body["model"] = f"models/{model_name.split('/')[-1]}"
+        body["ttl"] = f"{ttl_seconds}s"
+        response = await self.client.post(f"{self.base_url}/cachedContents", json=body)
+        response.raise_for_status()
+        return CachedPrefix(
+            name=response.json()["name"],
+            model_name=model_name,
+            prefix_hash="",
+            expires_at=time.time() + ttl_seconds,
+        )
+
+    async def refresh(self, entry: CachedPrefix, ttl_seconds: int) -> CachedPrefix:
+        response = await self.client.patch(
+            f"{self.base_url}/{entry.name}",
+            params={"updateMask": "ttl"},
+            json={"ttl": f"{ttl_seconds}s"},
+        )
+        response.raise_for_status()
+        entry.expires_at = time.time() + ttl_seconds
+        return entry
+
+    async def delete(self, entry: CachedPrefix) -> None:
+        response = await self.client.delete(f"{self.base_url}/{entry.name}")
+        if response.status_code != 404:
+            response.raise_for_status()
+
+
+class LocalPromptCacheProvider(PromptCacheProvider):
+    """
+    In-memory stand-in provider for offline development and tests.
+
+    Behaves like the Gemini API, including expiry, and can expand a rewritten
+    payload back to the original one with `resolve`.
+    """
+
+    def __init__(self):
+        self.store: Dict[str, Tuple[Dict[str, Any], float]] = {}
+        self.create_calls = 0
+        self.refresh_calls = 0
+
+    async def create(
+        self, model_name: str, prefix: Dict[str, Any], ttl_seconds: int
+    ) -> CachedPrefix:
+        self.create_calls += 1
+        name = f"cachedContents/local-{uuid.uuid4().hex[:12]}"
+        expires_at = time.time() + ttl_seconds
+        self.store[name] = (copy.deepcopy(prefix), expires_at)
+        return CachedPrefix(name, model_name, "", expires_at)
+
+    async def refresh(self, entry: CachedPrefix, ttl_seconds: int) -> CachedPrefix:
+        self.refresh_calls += 1
+        if entry.name not in self.store:
+            raise KeyError(f"Unknown cached content: {entry.name}")
+        prefix, _ = self.store[entry.name]
+        entry.expires_at = time.time() + ttl_seconds
+        self.store[entry.name] = (prefix, entry.expires_at)
+        return entry
+
+    async def delete(self, entry: CachedPrefix) -> None:
+        self.store.pop(entry.name, None)
+
+    def resolve(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Expand a payload that references a cached prefix."""
+        name = payload.get(self.handle_field)
+        if name is None:
+            return payload
+        prefix, expires_at = self.store.get(name, (None, 0.0))
+        if prefix is None or expires_at < time.time():
+            raise KeyError(f"Cached content not found or expired: {name}")
+        expanded = {k: v for k, v in payload.items() if k != self.handle_field}
+        expanded.update(copy.deepcopy(prefix))
+        return expanded
+
+
+class PromptPrefixCache:
+    """
+    Creates, refreshes and hands out cached prefixes, one per prompt version.
+
+    A prompt version is identified by the hash of the model name and the exact
+    prefix fields, so editing a prompt or a tool signature creates a new entry
+    while the old one simply expires on the provider.
+    """
+
+    def __init__(
+        self,
+        provider: PromptCacheProvider,
+        ttl_seconds: int = 3600,
+        refresh_margin_seconds: int = 300,
+        failure_cooldown_seconds: int = 600,
+    ):
+        self.provider = provider
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.failure_cooldown_seconds = failure_cooldown_seconds
+        self._entries: Dict[str, CachedPrefix] = {}
+        self._failed_until: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._wrapped_models: Dict[int, Any] = {}
+        self.metrics = {
+            "hits": 0,
+            "creates": 0,
+            "refreshes": 0,
+            "fallbacks": 0,
+            "invalidations": 0,
+        }
+
+    @staticmethod
+    def prefix_hash(model_name: str, prefix: Dict[str, Any]) -> str:
+        """Stable hash identifying a prompt version for a model."""
+        canonical = json.dumps(
+            {"model": model_name, "prefix": prefix},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    async def get(
+        self, model_name: str, prefix: Dict[str, Any]
+    ) -> Optional[CachedPrefix]:
+        """
+        Return a live cached prefix, creating or refreshing it when needed.
+
+        Returns:
+            The cached prefix, or None if the provider could not serve one.
+            Callers should then send the request unchanged.
+        """
+        key = self.prefix_hash(model_name, prefix)
+        if self._failed_until.get(key, 0.0) > time.time():
+            self.metrics["fallbacks"] += 1
+            return None
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(key)
+            now = time.time()
+            try:
+                if entry is None or entry.expires_at <= now:
+                    entry = await self.provider.create(
+                        model_name, prefix, self.ttl_seconds
+                    )
+                    entry.prefix_hash = key
+                    self.metrics["creates"] += 1
+                elif entry.expires_at - now <= self.refresh_margin_seconds:
+                    try:
+                        entry = await self.provider.refresh(entry, self.ttl_seconds)
+                        self.metrics["refreshes"] += 1
+                    except Exception as e:
+                        logger.warning(f"Refreshing {entry.name} failed: {e}")
+                        entry = await self.provider.create(
+                            model_name, prefix, self.ttl_seconds
+                        )
+                        entry.prefix_hash = key
+                        self.metrics["creates"] += 1
+                else:
+                    self.metrics["hits"] += 1
+            except Exception as e:
+                logger.warning(
+                    f"Prompt prefix caching unavailable for {model_name}: {e}"
+                )
+                self._entries.pop(key, None)
+                self._failed_until[key] = now + self.failure_cooldown_seconds
+                self.metrics["fallbacks"] += 1
+                return None
+
+            self._entries[key] = entry
+            return entry
+
+    def invalidate(self, entry: CachedPrefix) -> None:
+        """Forget an entry the provider no longer accepts."""
+        if self._entries.get(entry.prefix_hash) is entry:
+            del self._entries[entry.prefix_hash]
+            self.metrics["invalidations"] += 1
+
+    async def clear(self) -> None:
+        """Delete every entry from the provider."""
+        entries, self._entries = list(self._entries.values()), {}
+        for entry in entries:
+            try:
+                await self.provider.delete(entry)
+            except Exception as e:
+                logger.warning(f"Deleting {entry.name} failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters and the number of live entries."""
+        return {**self.metrics, "entries": len(self._entries)}
+
+    def wrap_model(self, model: Any) -> Any:
+        """
+        Return a copy of a pydantic-ai HTTP model whose requests use this cache.
+
+        The copy is memoised per model so all agents built on the same model
+        share a single HTTP client.
+        """
+        wrapped = self._wrapped_models.get(id(model))
+        if wrapped is None:
+            client = model.client
+            wrapped = copy.copy(model)
+            wrapped.client = httpx.AsyncClient(
+                base_url=client.base_url,
+                headers=client.headers,
+                timeout=client.timeout,
+                transport=PrefixCacheTransport(self),
+            )
+            self._wrapped_models[id(model)] = wrapped
+        return wrapped
+
+
+class PrefixCacheTransport(httpx.AsyncBaseTransport):
+    """
+    HTTP transport that swaps the static prefix of a model request for a
+    cached reference, and replays the original request if that fails.
+    """
+
+    # Statuses the provider uses for a missing, expired or rejected cache handle
+    fallback_statuses = (400, 403, 404)
+
+    def __init__(
+        self,
+        cache: PromptPrefixCache,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.cache = cache
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "POST" or ":" not in request.url.path:
+            return await self.transport.handle_async_request(request)
+
+        original = await request.aread()
+        try:
+            payload = json.loads(original)
+        except ValueError:
+            return await self.transport.handle_async_request(request)
+
+        prefix = self.cache.provider.extract_prefix(payload)
+        if prefix is None:
+            return await self.transport.handle_async_request(request)
+
+        # Path looks like /v1beta/models/<model>:generateContent
+        model_name = request.url.path.rsplit("/", 1)[-1].split(":", 1)[0]
+        entry = await self.cache.get(model_name, prefix)
+        if entry is None:
+            return await self.transport.handle_async_request(request)
+
+        cached_request = self._with_body(
+            request,
+            json.dumps(
+                self.cache.provider.attach(payload, entry), ensure_ascii=False
+            ).encode("utf-8"),
+        )
+        response = await self.transport.handle_async_request(cached_request)
+        if response.status_code not in self.fallback_statuses:
+            return response
+
+        await response.aread()
+        await response.aclose()
+        logger.warning(
+            f"Cached prefix {entry.name} rejected ({response.status_code}), "
+            "resending full request"
+        )
+        self.cache.invalidate(entry)
+        self.cache.metrics["fallbacks"] += 1
+        return await self.transport.handle_async_request(
+            self._with_body(request, original)
+        )
+
+    @staticmethod
+    def _with_body(request: httpx.Request, body: bytes) -> httpx.Request:
+        headers = httpx.Headers(request.headers)
+        headers["Content-Length"] = str(len(body))
+        return httpx.Request(
+            request.method,
+            request.url,
+            headers=headers,
+            content=body,
+            extensions=request.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+async def _demo():
+    """Run a few requests against the local provider and print the counters."""
+    provider = LocalPromptCacheProvider()
+    cache = PromptPrefixCache(provider, ttl_seconds=60, refresh_margin_seconds=10)
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = provider.resolve(json.loads(request.content))
+        seen.append(body["systemInstruction"]["parts"][0]["text"])
+        return httpx.Response(200, json={"ok": True})
+
+    client = httpx.AsyncClient(
+        base_url="https://example.test/v1beta/models/",
+        transport=PrefixCacheTransport(cache, httpx.MockTransport(handler)),
+    )
+    payload = {
+        "contents": [{"role": "user", "parts": [{"text": "Hello"}]}],
+        "systemInstruction": {"role": "user", "parts": [{"text": "Be brief."}]},
+    }
+    for _ in range(3):
+        await client.post("/gemini-2.0-flash:generateContent", json=payload)
+    print(f"Served prompts: {seen}")
+    print(f"Cache stats: {cache.stats()}, provider creates: {provider.create_calls}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_demo())
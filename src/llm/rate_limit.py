@@ -0,0 +1,222 @@
+"""
+Distributed rate limiting for LLM calls.
+
+`RedisRateLimiter` keeps token buckets in Redis so every worker shares the
+same budget. A call must take a token from the global bucket, the bucket of
+the current user and the bucket of the calling agent; the check and the
+update happen atomically in a Lua script. When a bucket is empty the caller
+waits for the next token instead of failing, up to `max_wait_seconds`.
+
+`RateLimitedModel` applies the limiter before every request a pydantic-ai
+agent makes. The current user is read from `llm.context.current_llm_user`,
+which chat handlers set at the start of a turn.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis.asyncio as aioredis
+from pydantic_ai.models.wrapper import WrapperModel
+
+from data.cache.redis_client import async_redis
+from llm.context import current_llm_user
+
+logger = logging.getLogger(__name__)
+
+# KEYS: bucket keys. ARGV[1]: cost, then (rate per second, capacity) per key.
+# Returns "0" when tokens were taken, otherwise the seconds until they are
+# available (as a string, since Lua numbers are truncated to integers).
+TOKEN_BUCKET_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local cost = tonumber(ARGV[1])
+local wait = 0
+local levels = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i])
+    local capacity = tonumber(ARGV[2 * i + 1])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    levels[i] = tokens
+    if tokens < cost then
+        wait = math.max(wait, (cost - tokens) / rate)
+    end
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i])
+    local capacity = tonumber(ARGV[2 * i + 1])
+    local tokens = levels[i]
+    if wait == 0 then
+        tokens = tokens - cost
+    end
+    redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return tostring(wait)
+"""
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call cannot get a token within the allowed wait."""
+
+
+@dataclass
+class RateLimit:
+    """A per-minute budget with an optional burst size (bucket capacity)."""
+
+    per_minute: int
+    burst: Optional[int] = None
+
+    @property
+    def rate(self) -> float:
+        return self.per_minute / 60.0
+
+    @property
+    def capacity(self) -> int:
+        # Default to a quarter of the minute budget to smooth class-wide bursts
+        return self.burst or max(1, self.per_minute // 4)
+
+
+class RedisRateLimiter:
+    """Token-bucket rate limiter shared by all workers through Redis."""
+
+    def __init__(
+        self,
+        global_limit: Optional[RateLimit] = None,
+        user_limit: Optional[RateLimit] = None,
+        agent_limit: Optional[RateLimit] = None,
+        agent_limits: Optional[Dict[str, RateLimit]] = None,
+        max_wait_seconds: Optional[float] = None,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        db: Optional[int] = None,
+        key_prefix: str = "ratelimit",
+        redis_client: Optional[aioredis.Redis] = None,
+    ):
+        """
+        Initialize the limiter.
+
+        Args:
+            global_limit: Budget shared by every call. Defaults to the
+                RATE_LIMIT_PER_MINUTE environment variable (60).
+            user_limit: Budget per user. Defaults to
+                RATE_LIMIT_PER_USER_PER_MINUTE (20).
+            agent_limit: Default budget per agent. Defaults to
+                RATE_LIMIT_PER_AGENT_PER_MINUTE (40).
+            agent_limits: Budgets for specific agent names.
+            max_wait_seconds: Longest a call queues before RateLimitExceeded.
+                Defaults to RATE_LIMIT_MAX_WAIT_SECONDS (20).
+            host, port, db: Redis location, defaulting to the REDIS_* settings
+                (including REDIS_PASSWORD).
+            key_prefix: Prefix of the bucket keys.
+            redis_client: Existing asyncio Redis client to use instead.
+        """
+        self.global_limit = global_limit or RateLimit(
+            int(os.getenv("RATE_LIMIT_PER_MINUTE", 60))
+        )
+        self.user_limit = user_limit or RateLimit(
+            int(os.getenv("RATE_LIMIT_PER_USER_PER_MINUTE", 20))
+        )
+        self.agent_limit = agent_limit or RateLimit(
+            int(os.getenv("RATE_LIMIT_PER_AGENT_PER_MINUTE", 40))
+        )
+        self.agent_limits = agent_limits or {}
+        self.max_wait_seconds = max_wait_seconds or float(
+            os.getenv("RATE_LIMIT_MAX_WAIT_SECONDS", 20)
+        )
+        self.key_prefix = key_prefix
+        self.redis_client = redis_client or async_redis(host, port, db)
+        self._script = self.redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+        self.metrics = {"acquired": 0, "waited": 0, "rejected": 0, "errors": 0}
+
+    def _buckets(
+        self, user: Optional[str], agent: Optional[str]
+    ) -> List[Tuple[str, RateLimit]]:
+        buckets = [(f"{self.key_prefix}:global", self.global_limit)]
+        if user and self.user_limit:
+            buckets.append((f"{self.key_prefix}:user:{user}", self.user_limit))
+        agent_limit = self.agent_limits.get(agent or "", self.agent_limit)
+        if agent and agent_limit:
+            buckets.append((f"{self.key_prefix}:agent:{agent}", agent_limit))
+        return buckets
+
+    async def try_acquire(
+        self, user: Optional[str] = None, agent: Optional[str] = None, cost: int = 1
+    ) -> float:
+        """
+        Take `cost` tokens from every applicable bucket if all have them.
+
+        Returns:
+            0.0 on success, otherwise the seconds to wait before retrying.
+        """
+        buckets = self._buckets(user, agent)
+        args: List[Any] = [cost]
+        for _, limit in buckets:
+            args.extend([limit.rate, limit.capacity])
+        wait = await self._script(keys=[key for key, _ in buckets], args=args)
+        return float(wait)
+
+    async def acquire(
+        self, user: Optional[str] = None, agent: Optional[str] = None, cost: int = 1
+    ):
+        """
+        Wait until a call is allowed.
+
+        Raises:
+            RateLimitExceeded: If no token is available within max_wait_seconds.
+        """
+        started = time.monotonic()
+        waited = False
+        while True:
+            try:
+                wait = await self.try_acquire(user=user, agent=agent, cost=cost)
+            except aioredis.RedisError as e:
+                # Fail open: a Redis outage must not take the chat down with it
+                self.metrics["errors"] += 1
+                logger.warning(f"Rate limiter unavailable, allowing call: {e}")
+                return
+            if wait <= 0:
+                self.metrics["acquired"] += 1
+                if waited:
+                    self.metrics["waited"] += 1
+                return
+            if time.monotonic() - started + wait > self.max_wait_seconds:
+                self.metrics["rejected"] += 1
+                raise RateLimitExceeded(
+                    f"LLM rate limit reached for user={user} agent={agent}; "
+                    f"next token in {wait:.1f}s"
+                )
+            waited = True
+            # Jitter spreads out waiters that would otherwise wake together
+            await asyncio.sleep(wait + random.uniform(0, 0.05))
+
+
+# Shared by every AgentClient unless another limiter is passed
+DEFAULT_RATE_LIMITER = RedisRateLimiter()
+
+
+class RateLimitedModel(WrapperModel):
+    """pydantic-ai model wrapper that takes a rate-limit token per request."""
+
+    def __init__(self, wrapped: Any, limiter: RedisRateLimiter, agent_name: str):
+        super().__init__(wrapped)
+        self.limiter = limiter
+        self.agent_name = agent_name
+
+    async def request(self, *args: Any, **kwargs: Any):
+        await self.limiter.acquire(user=current_llm_user.get(), agent=self.agent_name)
+        return await self.wrapped.request(*args, **kwargs)
+
+    @asynccontextmanager
+    async def request_stream(self, *args: Any, **kwargs: Any):
+        await self.limiter.acquire(user=current_llm_user.get(), agent=self.agent_name)
+        async with self.wrapped.request_stream(*args, **kwargs) as response_stream:
+            yield response_stream
@@ -0,0 +1,222 @@
+"""
+Retry policy for LLM calls.
+
+`RetryPolicy` retries transient failures (rate limits, 5xx responses,
+timeouts and malformed Gemini function calls) with exponential backoff, full
+jitter and an optional overall deadline. Requests are only cut short when a
+deadline or per-attempt timeout is configured, since a long generation is not
+a failure. It can also hedge slow calls: once a call has been running longer
+than the recent p95 latency, a duplicate request is sent and whichever
+finishes first wins.
+
+`RetryingModel` applies a policy to every request a pydantic-ai agent makes.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, FrozenSet, Optional, Tuple, TypeVar
+
+import httpx
+from pydantic_ai.models.wrapper import WrapperModel
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class LatencyTracker:
+    """Sliding window of recent call latencies."""
+
+    def __init__(self, window: int = 200):
+        self._samples: deque = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Return the `q` quantile (0-1) of recorded latencies, None if empty."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter, bounded by attempts and a deadline.
+
+    Attributes:
+        max_attempts: Total attempts, including the first one.
+        base_delay: Backoff before the first retry, in seconds.
+        max_delay: Upper bound of a single backoff.
+        multiplier: Backoff growth factor per attempt.
+        deadline: Optional time budget for all attempts, in seconds.
+        attempt_timeout: Optional timeout for a single attempt.
+        retry_status_codes: HTTP statuses treated as transient.
+        retry_markers: Substrings of error messages treated as transient.
+        hedge: Send a duplicate request when a call exceeds the p95 latency.
+        hedge_quantile: Latency quantile that triggers the hedge.
+        hedge_min_samples: Samples needed before hedging is enabled.
+    """
+
+    max_attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    multiplier: float = 2.0
+    deadline: Optional[float] = None
+    attempt_timeout: Optional[float] = None
+    retry_status_codes: FrozenSet[int] = frozenset({408, 429, 500, 502, 503, 504})
+    retry_markers: Tuple[str, ...] = (
+        "MALFORMED_FUNCTION_CALL",
+        "RESOURCE_EXHAUSTED",
+        "UNAVAILABLE",
+        "DEADLINE_EXCEEDED",
+        "Content field missing",
+    )
+    hedge: bool = False
+    hedge_quantile: float = 0.95
+    hedge_min_samples: int = 20
+    metrics: dict = field(
+        default_factory=lambda: {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0}
+    )
+
+    def is_retryable(self, error: BaseException) -> bool:
+        """Return True if `error` is worth retrying."""
+        if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+            return True
+        if isinstance(error, (httpx.TimeoutException, httpx.NetworkError)):
+            return True
+        status_code = getattr(error, "status_code", None)
+        if status_code is not None:
+            return status_code in self.retry_status_codes
+        message = str(error)
+        return any(marker in message for marker in self.retry_markers)
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter delay before retry number `attempt` (0-based)."""
+        cap = min(self.max_delay, self.base_delay * self.multiplier**attempt)
+        return random.uniform(0, cap)
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        latency: Optional[LatencyTracker] = None,
+    ) -> T:
+        """
+        Run `call` under this policy.
+
+        Args:
+            call: Zero-argument coroutine factory; called once per attempt.
+            latency: Tracker used for hedging and updated with successful calls.
+
+        Returns:
+            The result of the first successful attempt.
+        """
+        self.metrics["calls"] += 1
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            timeout = None
+            if self.deadline is not None:
+                timeout = self.deadline - (time.monotonic() - started)
+            if self.attempt_timeout is not None:
+                timeout = (
+                    self.attempt_timeout
+                    if timeout is None
+                    else min(timeout, self.attempt_timeout)
+                )
+            try:
+                attempt_started = time.monotonic()
+                pending = self._attempt(call, latency)
+                if timeout is not None:
+                    pending = asyncio.wait_for(pending, timeout=max(timeout, 0.001))
+                result = await pending
+                if latency is not None:
+                    latency.record(time.monotonic() - attempt_started)
+                return result
+            except Exception as e:
+                attempt += 1
+                delay = self.backoff(attempt - 1)
+                elapsed = time.monotonic() - started
+                if (
+                    not self.is_retryable(e)
+                    or attempt >= self.max_attempts
+                    or (self.deadline is not None and elapsed + delay >= self.deadline)
+                ):
+                    raise
+                self.metrics["retries"] += 1
+                logger.warning(
+                    f"Attempt {attempt} failed with {type(e).__name__}: {e}; "
+                    f"retrying in {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+
+    async def _attempt(
+        self, call: Callable[[], Awaitable[T]], latency: Optional[LatencyTracker]
+    ) -> T:
+        threshold = None
+        if (
+            self.hedge
+            and latency is not None
+            and len(latency) >= self.hedge_min_samples
+        ):
+            threshold = latency.percentile(self.hedge_quantile)
+        if threshold is None:
+            return await call()
+
+        primary = asyncio.ensure_future(call())
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=threshold)
+            if done:
+                return primary.result()
+
+            self.metrics["hedges"] += 1
+            hedged = asyncio.ensure_future(call())
+            pending.add(hedged)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedged:
+                            self.metrics["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            assert error is not None
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+class RetryingModel(WrapperModel):
+    """
+    pydantic-ai model wrapper that runs every request under a RetryPolicy.
+
+    Streaming requests are passed through unchanged, since a partially
+    consumed stream cannot be replayed.
+    """
+
+    def __init__(self, wrapped: Any, policy: RetryPolicy = DEFAULT_RETRY_POLICY):
+        super().__init__(wrapped)
+        self.policy = policy
+        self.latency = LatencyTracker()
+
+    async def request(self, *args: Any, **kwargs: Any):
+        return await self.policy.run(
+            lambda: self.wrapped.request(*args, **kwargs), latency=self.latency
+        )
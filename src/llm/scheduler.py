@@ -0,0 +1,178 @@
+"""
+Fair scheduling of LLM calls across chat sessions.
+
+Without scheduling, a session whose turn fans out to the schedule, email and
+calendar agents can occupy every connection while other students wait.
+`FairScheduler` caps the number of calls in flight and, when calls queue,
+serves them by priority lane first (interactive turns before background
+reports and indexing) and by weighted fair queuing between sessions within a
+lane, so each session gets a share of the capacity proportional to its weight.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic_ai.models.wrapper import WrapperModel
+
+from llm.context import Priority, current_llm_priority, current_llm_user
+
+
+class FairScheduler:
+    """Weighted fair queuing of LLM calls with priority lanes and a global cap."""
+
+    def __init__(self, max_in_flight: int = 8, default_weight: float = 1.0):
+        """
+        Initialize the scheduler.
+
+        Args:
+            max_in_flight: Maximum concurrent LLM calls across all sessions.
+            default_weight: Share given to sessions without an explicit weight.
+        """
+        self.max_in_flight = max_in_flight
+        self.default_weight = default_weight
+        self.in_flight = 0
+        self._weights: Dict[str, float] = {}
+        # Per lane: heap of (virtual finish tag, sequence, session, future)
+        self._lanes: Dict[Priority, List[Tuple[float, int, str, asyncio.Future]]] = {
+            lane: [] for lane in Priority
+        }
+        self._virtual_time: Dict[Priority, float] = {lane: 0.0 for lane in Priority}
+        self._last_finish: Dict[Tuple[Priority, str], float] = {}
+        self._queued_by_session: Dict[str, int] = defaultdict(int)
+        self._sequence = itertools.count()
+        self.metrics = {"dispatched": 0, "queued": 0, "max_wait_seconds": 0.0}
+
+    def set_weight(self, session: str, weight: float):
+        """Give `session` a larger (or smaller) share of the capacity."""
+        self._weights[session] = weight
+
+    def _tag(self, lane: Priority, session: str) -> float:
+        weight = self._weights.get(session, self.default_weight)
+        start = max(
+            self._virtual_time[lane], self._last_finish.get((lane, session), 0.0)
+        )
+        finish = start + 1.0 / weight
+        self._last_finish[(lane, session)] = finish
+        return finish
+
+    async def acquire(
+        self, session: Optional[str] = None, priority: Priority = Priority.INTERACTIVE
+    ):
+        """Wait for a call slot."""
+        session = session or "anonymous"
+        if self.in_flight < self.max_in_flight and not self.queue_depth():
+            self.in_flight += 1
+            self.metrics["dispatched"] += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(
+            self._lanes[priority],
+            (self._tag(priority, session), next(self._sequence), session, future),
+        )
+        self._queued_by_session[session] += 1
+        self.metrics["queued"] += 1
+        queued_at = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was granted just as the caller gave up, pass it on
+                self.release()
+            raise
+        finally:
+            self._queued_by_session[session] -= 1
+            if not self._queued_by_session[session]:
+                del self._queued_by_session[session]
+                key = (priority, session)
+                if self._last_finish.get(key, 0.0) <= self._virtual_time[priority]:
+                    self._last_finish.pop(key, None)
+        self.metrics["max_wait_seconds"] = max(
+            self.metrics["max_wait_seconds"], time.monotonic() - queued_at
+        )
+
+    def release(self):
+        """Free a call slot and hand it to the next queued call."""
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.in_flight < self.max_in_flight:
+            for lane in Priority:
+                heap = self._lanes[lane]
+                while heap and heap[0][3].done():
+                    heapq.heappop(heap)  # cancelled while queued
+                if heap:
+                    tag, _, _, future = heapq.heappop(heap)
+                    self._virtual_time[lane] = tag
+                    self.in_flight += 1
+                    self.metrics["dispatched"] += 1
+                    future.set_result(None)
+                    break
+            else:
+                return
+
+    @asynccontextmanager
+    async def slot(
+        self, session: Optional[str] = None, priority: Optional[Priority] = None
+    ):
+        """Hold a call slot for the duration of the block."""
+        if priority is None:
+            priority = current_llm_priority.get()
+        await self.acquire(session or current_llm_user.get(), priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def queue_depth(self, priority: Optional[Priority] = None) -> int:
+        """Number of calls waiting, in one lane or in all lanes."""
+        lanes = [priority] if priority is not None else list(Priority)
+        return sum(
+            1 for lane in lanes for entry in self._lanes[lane] if not entry[3].done()
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Return in-flight and queue-depth metrics per lane and per session."""
+        return {
+            **self.metrics,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": {
+                lane.name.lower(): self.queue_depth(lane) for lane in Priority
+            },
+            "queued_sessions": dict(self._queued_by_session),
+        }
+
+
+DEFAULT_SCHEDULER = FairScheduler(max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", 8)))
+
+
+class ScheduledModel(WrapperModel):
+    """pydantic-ai model wrapper that holds a scheduler slot for every request."""
+
+    def __init__(
+        self,
+        wrapped: Any,
+        scheduler: FairScheduler,
+        priority: Optional[Priority] = None,
+    ):
+        super().__init__(wrapped)
+        self.scheduler = scheduler
+        self.priority = priority
+
+    async def request(self, *args: Any, **kwargs: Any):
+        async with self.scheduler.slot(priority=self.priority):
+            return await self.wrapped.request(*args, **kwargs)
+
+    @asynccontextmanager
+    async def request_stream(self, *args: Any, **kwargs: Any):
+        async with self.scheduler.slot(priority=self.priority):
+            async with self.wrapped.request_stream(*args, **kwargs) as response_stream:
+                yield response_stream
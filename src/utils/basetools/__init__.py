@@ -1,124 +1,103 @@
-# Calculator Tool
-from .calculator_tool import (
-    CalculatorTool,
-    CalculationInput,
-    CalculationOutput,
-    BasicOperationInput,
-    TrigonometricInput,
-    LogarithmInput,
-    MemoryOperation,
-    OperationType,
-    calculate,
-    basic_math,
-    trigonometry,
-    logarithm,
-    calculator_memory,
-)
+"""
+Base tools shared by the agents.
 
-# Classification Tool
-from .classfication_tool import (
-    SearchInput as ClassificationInput,
-    SearchOutput as ClassificationOutput,
-)
+Tool modules are imported on first attribute access (PEP 562), so
+`from utils.basetools import send_email_tool` only imports that tool, not
+pymilvus and the embedding stack behind the FAQ tool or the Gemini-backed
+classifier (which needs GEMINI_API_KEY at import). `python -m utils.basetools.import_benchmark` guards this.
+"""
 
-# FAQ Tool
-from .faq_tool import (
-    SearchInput as FAQInput,
-    SearchOutput as FAQOutput,
-    faq_tool,
-    create_faq_tool,
-)
+import importlib
+import sys
+import types
+from typing import Any, Dict, Tuple
 
-# File Reading Tool
-from .file_reading_tool import FileContentOutput, read_file_tool, create_read_file_tool
-
-# HTTP Tool
-from .http_tool import (
-    BodyType,
-    ResponseType,
-    HTTPMethod,
-    HttpRequest,
-    HttpResponse,
-    http_tool,
-)
-
-# Merge Files Tool
-from .merge_files_tool import MergeInput, MergeOutput, merge_files_tool
-
-# Search in File Tool
-from .search_in_file_tool import (
-    SearchInput as SearchInFileInput,
-    SearchOutput as SearchInFileOutput,
-    normalize,
-    create_search_in_file_tool,
-)
-
-# Search Web Tool
-from .search_web_tool import (
-    SearchInput as WebSearchInput,
-    SearchOutput as WebSearchOutput,
-    search_web,
-)
-
-# Send Email Tool
-from .send_email_tool import (
-    EmailToolInput,
-    EmailToolOutput,
-    send_email_tool,
-    create_send_email_tool,
-)
-
-# Export all for easy import with *
-__all__ = [
+# Public name -> (module, attribute in that module)
+_EXPORTS: Dict[str, Tuple[str, str]] = {
     # Calculator Tool
-    "CalculatorTool",
-    "CalculationInput",
-    "CalculationOutput",
-    "BasicOperationInput",
-    "TrigonometricInput",
-    "LogarithmInput",
-    "MemoryOperation",
-    "OperationType",
-    "calculate",
-    "basic_math",
-    "trigonometry",
-    "logarithm",
-    "calculator_memory",
+    "CalculatorTool": ("calculator_tool", "CalculatorTool"),
+    "CalculationInput": ("calculator_tool", "CalculationInput"),
+    "CalculationOutput": ("calculator_tool", "CalculationOutput"),
+    "BasicOperationInput": ("calculator_tool", "BasicOperationInput"),
+    "TrigonometricInput": ("calculator_tool", "TrigonometricInput"),
+    "LogarithmInput": ("calculator_tool", "LogarithmInput"),
+    "MemoryOperation": ("calculator_tool", "MemoryOperation"),
+    "OperationType": ("calculator_tool", "OperationType"),
+    "calculate": ("calculator_tool", "calculate"),
+    "basic_math": ("calculator_tool", "basic_math"),
+    "trigonometry": ("calculator_tool", "trigonometry"),
+    "logarithm": ("calculator_tool", "logarithm"),
+    "calculator_memory": ("calculator_tool", "calculator_memory"),
     # Classification Tool
-    "ClassificationInput",
-    "ClassificationOutput",
+    "ClassificationInput": ("classfication_tool", "SearchInput"),
+    "ClassificationOutput": ("classfication_tool", "SearchOutput"),
     # FAQ Tool
-    "FAQInput",
-    "FAQOutput",
-    "faq_tool",
-    "create_faq_tool",
+    "FAQInput": ("faq_tool", "SearchInput"),
+    "FAQOutput": ("faq_tool", "SearchOutput"),
+    "faq_tool": ("faq_tool", "faq_tool"),
+    "create_faq_tool": ("faq_tool", "create_faq_tool"),
     # File Reading Tool
-    "FileContentOutput",
-    "read_file_tool",
-    "create_read_file_tool",
+    "FileContentOutput": ("file_reading_tool", "FileContentOutput"),
+    "read_file_tool": ("file_reading_tool", "read_file_tool"),
+    "create_read_file_tool": ("file_reading_tool", "create_read_file_tool"),
     # HTTP Tool
-    "BodyType",
-    "ResponseType",
-    "HTTPMethod",
-    "HttpRequest",
-    "HttpResponse",
-    "http_tool",
+    "BodyType": ("http_tool", "BodyType"),
+    "ResponseType": ("http_tool", "ResponseType"),
+    "HTTPMethod": ("http_tool", "HTTPMethod"),
+    "HttpRequest": ("http_tool", "HttpRequest"),
+    "HttpResponse": ("http_tool", "HttpResponse"),
+    "http_tool": ("http_tool", "http_tool"),
     # Merge Files Tool
-    "MergeInput",
-    "MergeOutput",
-    "merge_files_tool",
+    "MergeInput": ("merge_files_tool", "MergeInput"),
+    "MergeOutput": ("merge_files_tool", "MergeOutput"),
+    "merge_files_tool": ("merge_files_tool", "merge_files_tool"),
     # Search in File Tool
-    "SearchInFileInput",
-    "SearchInFileOutput",
-    "normalize",
-    "create_search_in_file_tool",
+    "SearchInFileInput": ("search_in_file_tool", "SearchInput"),
+    "SearchInFileOutput": ("search_in_file_tool", "SearchOutput"),
+    "normalize": ("search_in_file_tool", "normalize"),
+    "create_search_in_file_tool": ("search_in_file_tool", "create_search_in_file_tool"),
     # Search Web Tool
-    "WebSearchInput",
-    "WebSearchOutput",
-    "search_web",
+    "WebSearchInput": ("search_web_tool", "SearchInput"),
+    "WebSearchOutput": ("search_web_tool", "SearchOutput"),
+    "search_web": ("search_web_tool", "search_web"),
     # Send Email Tool
-    "EmailToolInput",
-    "EmailToolOutput",
-    "send_email_tool",
-    "create_send_email_tool",
-]
+    "EmailToolInput": ("send_email_tool", "EmailToolInput"),
+    "EmailToolOutput": ("send_email_tool", "EmailToolOutput"),
+    "send_email_tool": ("send_email_tool", "send_email_tool"),
+    "create_send_email_tool": ("send_email_tool", "create_send_email_tool"),
+}
+
+# Export all for easy import with * (which imports every tool)
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        module_name, attribute = _EXPORTS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(importlib.import_module(f".{module_name}", __name__), attribute)
+    # Cache it so later lookups skip __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
+
+
+class _Package(types.ModuleType):
+    def __setattr__(self, name: str, value: Any):
+        # Importing a submodule binds it on the package. faq_tool, http_tool
+        # and merge_files_tool are also the names of functions exported here,
+        # so keep the function, as the eager imports did.
+        if (
+            isinstance(value, types.ModuleType)
+            and value.__name__ == f"{__name__}.{name}"
+            and _EXPORTS.get(name, ("", ""))[0] == name
+        ):
+            value = getattr(value, _EXPORTS[name][1])
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
@@ -24,7 +24,6 @@ from pymilvus import (
     DataType,
 )
 
-
 # Set environment variables for Milvus connection
 # Ensure these are set in your environment before running the script
 # os.environ["MILVUS_URI"] = "your-milvus-uri"
@@ -103,7 +102,10 @@ def document_chunking_tool(input: DocumentChunkingInput) -> DocumentChunkingOutp
             min_similarity=input.min_similarity,
             overlap=input.overlap,
         )
-        chunks = splitter.split(content)
+        try:
+            chunks = splitter.split(content)
+        finally:
+            splitter.close()
         if not chunks:
             return DocumentChunkingOutput(success=False, message="No chunks generated.")
 
@@ -1,11 +1,8 @@
-from data.embeddings.embedding_engine import EmbeddingEngine
-from data.milvus.milvus_client import MilvusClient
+from data.milvus.milvus_client import MilvusClient, with_client
 from typing import List
 from pydantic import BaseModel, Field
 from typing import Dict, Any
 
-embedding_engine = EmbeddingEngine()
-
 
 class SearchInput(BaseModel):
     query: str = Field(..., description="Search query")
@@ -24,16 +21,18 @@ class SearchOutput(BaseModel):
 def faq_tool(
     input: SearchInput, collection_name: str = "summerschool_workshop"
 ) -> SearchOutput:
-    client = MilvusClient(collection_name=collection_name)
-
-    query_embedding = embedding_engine.get_query_embedding(input.query)
-
-    results = client.hybrid_search(
-        query_text=input.query,
-        query_dense_embedding=query_embedding,
-        limit=input.limit,
-        search_answers=input.search_answers,
-    )
+    def search(client: MilvusClient) -> List[Dict[str, Any]]:
+        # Embedded with the model recorded for this collection
+        query_embedding = client.embed_query(input.query)
+        return client.hybrid_search(
+            query_text=input.query,
+            query_dense_embedding=query_embedding,
+            limit=input.limit,
+            search_answers=input.search_answers,
+        )
+
+    # Shared per-process client; reconnects and retries once if the search fails
+    results = with_client(collection_name, search)
     return SearchOutput(results=results)
 
 
@@ -0,0 +1,121 @@
+"""
+Import-time regression check for `utils.basetools`.
+
+Each measurement runs in a fresh interpreter, so nothing is already cached in
+`sys.modules`. Importing the package itself must stay cheap and must not pull
+in any heavy dependency; importing a single tool should only cost that tool.
+
+    cd src
+    python -m utils.basetools.import_benchmark
+    python -m utils.basetools.import_benchmark --budget-ms 50 --tools search_web
+
+Exits with status 1 if the package import goes over budget or loads one of
+HEAVY_MODULES.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import List, Optional
+
+# Modules that must never be imported by `import utils.basetools`
+HEAVY_MODULES = (
+    "pymilvus",
+    "sentence_transformers",
+    "torch",
+    "numpy",
+    "pandas",
+    "google.genai",
+    "pydantic_ai",
+)
+
+_PROBE = """
+import json, sys, time
+baseline = set(sys.modules)
+started = time.perf_counter()
+exec({statement!r})
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "modules": sorted(set(sys.modules) - baseline)}}))
+"""
+
+
+def measure(statement: str, cwd: Optional[str] = None) -> dict:
+    """
+    Run an import statement in a fresh interpreter.
+
+    Args:
+        statement: Python code to time, e.g. "import utils.basetools".
+        cwd: Directory to run from, defaulting to `src`.
+
+    Returns:
+        The elapsed seconds and the modules newly loaded by the statement.
+    """
+    src = cwd or os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(statement=statement)],
+        cwd=src,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        error = (result.stderr.strip().splitlines() or ["unknown error"])[-1]
+        return {"seconds": None, "modules": [], "error": error}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def heavy_modules(modules: List[str]) -> List[str]:
+    return [name for name in modules if name in HEAVY_MODULES]
+
+
+def run(tools: List[str], budget_ms: float) -> bool:
+    """Print import costs and return whether the package import is within budget."""
+    package = measure("import utils.basetools")
+    if package.get("error"):
+        print(f"import utils.basetools failed: {package['error']}")
+        return False
+    package_ms = package["seconds"] * 1000
+    heavy = heavy_modules(package["modules"])
+    print(
+        f"{'import utils.basetools':<55} {package_ms:>8.1f} ms "
+        f"{len(package['modules']):>5} modules"
+    )
+    for tool in tools:
+        result = measure(f"from utils.basetools import {tool}")
+        label = f"from utils.basetools import {tool}"
+        if result.get("error"):
+            print(f"{label:<55} failed: {result['error']}")
+            continue
+        print(
+            f"{label:<55} {result['seconds'] * 1000:>8.1f} ms "
+            f"{len(result['modules']):>5} modules "
+            f"{', '.join(heavy_modules(result['modules']))}"
+        )
+
+    ok = True
+    if heavy:
+        print(f"REGRESSION: import utils.basetools loads {', '.join(heavy)}")
+        ok = False
+    if package_ms > budget_ms:
+        print(f"REGRESSION: import utils.basetools took {package_ms:.1f} ms")
+        ok = False
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import cost of utils.basetools")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=100.0,
+        help="maximum time for `import utils.basetools`",
+    )
+    parser.add_argument(
+        "--tools",
+        nargs="*",
+        default=["send_email_tool", "search_web", "calculate", "faq_tool"],
+        help="names to import one at a time",
+    )
+    args = parser.parse_args()
+    sys.exit(0 if run(args.tools, args.budget_ms) else 1)
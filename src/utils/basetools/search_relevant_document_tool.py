@@ -2,10 +2,7 @@ from typing import List
 
 from pydantic import BaseModel, Field
 
-from data.embeddings.embedding_engine import EmbeddingEngine
-from data.milvus.milvus_client import MilvusClient
-
-embedding_engine = EmbeddingEngine()
+from data.milvus.milvus_client import MilvusClient, with_client
 
 
 class SearchRelevantDocumentInput(BaseModel):
@@ -39,15 +36,18 @@ def search_relevant_document(
     This tool retrieves raw, relevant text chunks from a knowledge base, whereas the FAQ tool
     matches a query to a pre-defined question and returns its corresponding pre-written answer.
     """
-    client = MilvusClient(collection_name=input.collection_name)
-
-    query_embedding = embedding_engine.get_query_embedding(input.user_query)
 
-    search_results = client.generic_hybrid_search(
-        query_dense_embedding=query_embedding,
-        limit=input.k,
-        query_text=input.user_query,
-    )
+    def search(client: MilvusClient):
+        # Embedded with the model recorded for this collection
+        query_embedding = client.embed_query(input.user_query)
+        return client.generic_hybrid_search(
+            query_dense_embedding=query_embedding,
+            limit=input.k,
+            query_text=input.user_query,
+        )
+
+    # Shared per-process client; reconnects and retries once if the search fails
+    search_results = with_client(input.collection_name, search)
 
     relevant_documents = []
     for result in search_results:
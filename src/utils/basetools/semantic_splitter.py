@@ -11,6 +11,8 @@ from sentence_transformers import SentenceTransformer
 from pathlib import Path
 import docx2txt, PyPDF2
 
+from data.embeddings.model_registry import default_backend, registry
+
 
 def load_txt(path: str | Path) -> str:
     return Path(path).read_text(encoding="utf-8")
@@ -35,6 +37,8 @@ class SemanticSplitter:
     max_tokens: int = 200
     min_similarity: float = 0.6
     overlap: int = 0
+    # "torch" or "onnx", see data.embeddings.onnx_backend
+    backend: str = field(default_factory=default_backend)
 
     _nlp: spacy.language.Language = field(init=False, repr=False)
     _model: SentenceTransformer = field(init=False, repr=False)
@@ -54,7 +58,14 @@ class SemanticSplitter:
             self._nlp = spacy.blank("en")
             self._nlp.add_pipe("sentencizer")
 
-        self._model = SentenceTransformer(self.model_name)
+        # Loaded once per process and shared across tool invocations
+        self._model = registry.acquire(self.model_name, self.backend)
+
+    def close(self):
+        """Release the model back to the shared registry."""
+        if self._model is not None:
+            self._model = None
+            registry.release(self.model_name, self.backend)
 
     def split(self, text: str) -> List[str]:
         sentences = self._sentences(text)
@@ -40,11 +40,16 @@ def safe_calendar_wrapper(func, *args, **kwargs):
 async def safe_agent_run(agent, prompt: str, max_retries: int = 2):
     """
     Safely run agent with retries for function call errors
+
+    Only MALFORMED_FUNCTION_CALL is retried here: it is raised when Gemini
+    cannot produce a function call, so the failing turn ran no tool. Rate
+    limits, 5xx responses and timeouts are retried per model request by
+    `RetryingModel`; re-running a whole run for them could repeat tool calls
+    that already succeeded, such as creating calendar events.
     """
     for attempt in range(max_retries):
         try:
-            result = await agent.run(prompt)
-            return result
+            return await agent.run(prompt)
         except Exception as e:
             if "MALFORMED_FUNCTION_CALL" in str(e) and attempt < max_retries - 1:
                 print(
@@ -52,8 +57,7 @@ async def safe_agent_run(agent, prompt: str, max_retries: int = 2):
                 )
                 await asyncio.sleep(1)  # Wait before retry
                 continue
-            else:
-                raise e
+            raise
 
     # If all retries failed
     raise Exception("All retry attempts failed")
@@ -1,9 +1,15 @@
 import os
 from llm.base import AgentClient
+from llm.prompt_cache import GeminiPromptCacheProvider, PromptPrefixCache
+from llm.context import Priority, current_llm_user
+from llm.retry import RetryPolicy
 from pydantic_ai.models.gemini import GeminiModel
 from pydantic_ai.providers.google_gla import GoogleGLAProvider
 
 from data.cache.memory_handler import MessageMemoryHandler
+from data.cache.long_term_memory import StudentMemoryStore
+from data.cache.distributed_lock import WeeklyReportGuard
+from data.cache.semantic_cache import SemanticAnswerCache
 
 from data.prompts.decision import DECISION_PROMPT
 from data.prompts.search_web import SEARCH_WEB_PROMPT
@@ -13,7 +19,7 @@ from data.prompts.scheule import SCHEULE_PROMPT
 from data.prompts.evaluate_for_email import EVALUATE_PROMPT
 import chainlit as cl
 
-from utils.basetools import *
+from utils.basetools import create_send_email_tool, search_web
 from utils.basetools.google_calendar import (create_calendar_event_simple,read_calendar_events)
 from utils.basetools.search_student import (get_latest_test_tool_func,)
 
@@ -24,6 +30,8 @@ from ui_handlers import start_chat, set_chat_starters
 # Initialize model and provider
 provider = GoogleGLAProvider(api_key=os.getenv("GEMINI_API_KEY"))
 model = GeminiModel('gemini-2.5-flash', provider=provider)
+# Static system prompts and tool declarations are cached once per prompt version
+prompt_cache = PromptPrefixCache(GeminiPromptCacheProvider(api_key=os.getenv("GEMINI_API_KEY")))
 #---------------------------------------------
 # Debug email configuration
 print(f"SENDER_EMAIL: {os.getenv('SENDER_EMAIL')}")
@@ -36,19 +44,29 @@ send_email = create_send_email_tool(
 )
 
 # Initialize agent with tools
+# The routing call is short and on every turn, so hedge it once it exceeds p95 latency
 agent_decision = AgentClient(
     model=model,
+    prompt_cache=prompt_cache,
+    retry_policy=RetryPolicy(hedge=True),
+    name="decision",
     system_prompt=DECISION_PROMPT,  
 ).create_agent()
 
 agent_evaluate_for_email = AgentClient(
     model=model,
+    prompt_cache=prompt_cache,
+    name="evaluate_for_email",
+    priority=Priority.BACKGROUND,
     system_prompt=EVALUATE_PROMPT,
     tools=[get_latest_test_tool_func]
 ).create_agent()
 
 agent_send_email = AgentClient(
     model=model,
+    prompt_cache=prompt_cache,
+    name="send_email",
+    priority=Priority.BACKGROUND,
     system_prompt=SEND_EMAIL_PROMPT,
     tools=[send_email]
 ).create_agent()
@@ -56,27 +74,37 @@ agent_send_email = AgentClient(
 
 agent_evaluate = AgentClient(
     model=model,
+    prompt_cache=prompt_cache,
+    name="evaluate",
     system_prompt=SCHEULE_PROMPT,
     tools=[get_latest_test_tool_func]
 ).create_agent()
 
 agent_calendar = AgentClient(
     model=model,
+    prompt_cache=prompt_cache,
+    name="calendar",
     system_prompt=CALENDAR_PROMPT,
     tools=[read_calendar_events, create_calendar_event_simple]
 ).create_agent()
 
 agent_knowledge_from_web = AgentClient(
     model=model,
+    prompt_cache=prompt_cache,
+    name="knowledge_from_web",
     system_prompt=SEARCH_WEB_PROMPT,
     tools=[search_web]
 ).create_agent()
 
-memory_handler = MessageMemoryHandler(max_messages=15)
+long_term_memory = StudentMemoryStore()
+memory_handler = MessageMemoryHandler(max_messages=15, long_term_memory=long_term_memory)
+report_guard = WeeklyReportGuard()
+semantic_cache = SemanticAnswerCache(threshold=0.92, ttl_seconds=24 * 3600, max_entries=1000)
 
 @cl.on_chat_start
 async def start():
     """Initialize chat session"""
+    memory_handler.start_compactor()
     await start_chat()
     
 @cl.set_starters
@@ -86,9 +114,10 @@ async def set_starters(user=None):
 
 @cl.on_message
 async def main(message: cl.Message):    
+    current_llm_user.set(cl.user_session.get("id"))
     try:
         # Get message with context
-        message_with_context = memory_handler.get_history_message(message.content)
+        message_with_context = await memory_handler.aget_history_message(message.content)
         
         # Get decision from agent
         decision = await agent_decision.run((message_with_context))
@@ -103,10 +132,12 @@ async def main(message: cl.Message):
         if decision_clean == "calendar":
             await handle_calendar_request(
                 agent_evaluate, agent_evaluate_for_email, agent_send_email, 
-                agent_calendar, memory_handler, message_with_context
+                agent_calendar, memory_handler, message_with_context,
+                report_guard=report_guard
             )
         elif decision_clean == "web":
-            await handle_web_request(agent_knowledge_from_web, memory_handler, message_with_context)
+            await handle_web_request(agent_knowledge_from_web, memory_handler, message_with_context,
+                                     question=message.content, semantic_cache=semantic_cache)
         else:
             print(f"Unknown decision: '{decision_clean}'")
             await handle_unknown_request()
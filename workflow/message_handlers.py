@@ -1,14 +1,17 @@
 """
 Message handlers for different types of user requests
 """
+import asyncio
 import json
 from datetime import datetime
 import chainlit as cl
+import redis
 from utils.safe_calendar import safe_agent_run, get_current_week_dates
 
 
 async def handle_calendar_request(agent_evaluate, agent_evaluate_for_email, agent_send_email, 
-                                agent_calendar, memory_handler, message_with_context):
+                                agent_calendar, memory_handler, message_with_context,
+                                report_guard=None):
     """Handle calendar-related requests"""
     print("Running calendar agent...")
     try:
@@ -28,68 +31,110 @@ async def handle_calendar_request(agent_evaluate, agent_evaluate_for_email, agen
                     
                     # Handle weekend email
                     await _handle_weekend_email(agent_evaluate_for_email, agent_send_email, 
-                                              memory_handler, message_with_context)
+                                              memory_handler, message_with_context, report_guard)
                     
                     # Handle calendar creation
                     await _handle_calendar_creation(agent_calendar, memory_handler, schedule_response)
                 else:
                     print("Schedule not confirmed, skipping calendar creation")
-                    memory_handler.store_bot_response(str(schedule_response.output))
+                    await memory_handler.astore_bot_response(str(schedule_response.output))
             else:
                 print("No JSON found in response, skipping calendar creation")
-                memory_handler.store_bot_response(str(schedule_response.output))
+                await memory_handler.astore_bot_response(str(schedule_response.output))
         except (json.JSONDecodeError, KeyError) as e:
             print(f"Error parsing schedule response: {e}")
             print("Skipping calendar creation")
-            memory_handler.store_bot_response(str(schedule_response.output))
+            await memory_handler.astore_bot_response(str(schedule_response.output))
     except Exception as schedule_error:
         print(f"Error creating schedule: {schedule_error}")
         error_message = f"❌ Lỗi khi tạo lịch học: {str(schedule_error)}"
         await cl.Message(content=error_message).send()
-        memory_handler.store_bot_response(error_message)
+        await memory_handler.astore_bot_response(error_message)
 
 
 async def _handle_weekend_email(agent_evaluate_for_email, agent_send_email, 
-                               memory_handler, message_with_context):
-    """Handle weekend email sending logic"""
+                               memory_handler, message_with_context, report_guard=None):
+    """Handle weekend email sending logic, at most once per student and ISO week"""
     weekend_email_sent = cl.user_session.get("weekend_email_sent", False)
     today = datetime.now()
     is_weekend = today.weekday() >= 5  # Saturday = 5, Sunday = 6
     print(f"Today: {today}, is_weekend: {is_weekend}, email_sent: {weekend_email_sent}")
-    
-    if is_weekend and not weekend_email_sent:
-        try:
-            print("Sending weekend report...")
-            evaluation_response = await agent_evaluate_for_email.run(
-                f"Tạo báo cáo đánh giá kết quả học tập của học sinh dựa trên các bài kiểm tra gần đây nhất. Context từ cuộc trò chuyện: {message_with_context}"
-            )
-            print(f"Evaluation response: {evaluation_response.output}")
-            
-            if evaluation_response and evaluation_response.output:
-                email_prompt = f"""
-                Hãy gửi email báo cáo tình hình học tập cuối tuần với nội dung sau:
-                
-                {evaluation_response.output}
-                
-                Email này sẽ được gửi đến phụ huynh/giáo viên để cập nhật tình hình học tập của học sinh.
-                """
-                
-                email_response = await agent_send_email.run(email_prompt)
-                print(f"Email response: {email_response.output}")
-                
-                cl.user_session.set("weekend_email_sent", True)
-                
-                weekend_msg = f"📧 **Báo cáo cuối tuần đã được gửi!**\n\nEmail báo cáo tình hình học tập đã được gửi thành công.\n\n{str(email_response.output)}"
-                await cl.Message(content=weekend_msg).send()
-                memory_handler.store_bot_response(weekend_msg)
-                
-        except Exception as e:
-            print(f"Error sending weekend report: {e}")
-            error_msg = f"❌ Lỗi khi gửi báo cáo cuối tuần: {str(e)}"
-            await cl.Message(content=error_msg).send()
-            memory_handler.store_bot_response(error_msg)
-    elif is_weekend and weekend_email_sent:
+
+    if not is_weekend:
+        return
+    if weekend_email_sent:
         print("Weekend email already sent in this session")
+        return
+    if report_guard is None:
+        await _send_weekend_report(agent_evaluate_for_email, agent_send_email,
+                                   memory_handler, message_with_context)
+        return
+
+    # Tabs and workers of one student share the ID, unlike Chainlit session ids
+    student_id = cl.user_session.get("student_id")
+    if not student_id:
+        print("Weekend report postponed: student ID not known yet")
+        await cl.Message(
+            content="📧 Vui lòng cho biết mã số học sinh để nhận báo cáo học tập cuối tuần."
+        ).send()
+        return
+    week = report_guard.iso_week(today)
+    attempted = False
+    try:
+        async with report_guard.claim(student_id, week) as should_send:
+            if not should_send:
+                print(f"Weekend report for {student_id} ({week}) already sent or in progress")
+                cl.user_session.set("weekend_email_sent", True)
+                return
+            attempted = True
+            if await _send_weekend_report(agent_evaluate_for_email, agent_send_email,
+                                          memory_handler, message_with_context):
+                await report_guard.mark_sent(student_id, week)
+    except redis.RedisError as e:
+        if attempted:
+            print(f"Weekend report sent but its weekly flag could not be saved: {e}")
+            return
+        # Without Redis we cannot coordinate workers; fall back to the session flag
+        print(f"Report guard unavailable, using session flag: {e}")
+        await _send_weekend_report(agent_evaluate_for_email, agent_send_email,
+                                   memory_handler, message_with_context)
+
+
+async def _send_weekend_report(agent_evaluate_for_email, agent_send_email,
+                               memory_handler, message_with_context):
+    """Generate and email the weekend report. Returns True if it was sent."""
+    try:
+        print("Sending weekend report...")
+        evaluation_response = await agent_evaluate_for_email.run(
+            f"Tạo báo cáo đánh giá kết quả học tập của học sinh dựa trên các bài kiểm tra gần đây nhất. Context từ cuộc trò chuyện: {message_with_context}"
+        )
+        print(f"Evaluation response: {evaluation_response.output}")
+        
+        if evaluation_response and evaluation_response.output:
+            email_prompt = f"""
+            Hãy gửi email báo cáo tình hình học tập cuối tuần với nội dung sau:
+            
+            {evaluation_response.output}
+            
+            Email này sẽ được gửi đến phụ huynh/giáo viên để cập nhật tình hình học tập của học sinh.
+            """
+            
+            email_response = await agent_send_email.run(email_prompt)
+            print(f"Email response: {email_response.output}")
+            
+            cl.user_session.set("weekend_email_sent", True)
+            
+            weekend_msg = f"📧 **Báo cáo cuối tuần đã được gửi!**\n\nEmail báo cáo tình hình học tập đã được gửi thành công.\n\n{str(email_response.output)}"
+            await cl.Message(content=weekend_msg).send()
+            await memory_handler.astore_bot_response(weekend_msg)
+            return True
+            
+    except Exception as e:
+        print(f"Error sending weekend report: {e}")
+        error_msg = f"❌ Lỗi khi gửi báo cáo cuối tuần: {str(e)}"
+        await cl.Message(content=error_msg).send()
+        await memory_handler.astore_bot_response(error_msg)
+    return False
 
 
 async def _handle_calendar_creation(agent_calendar, memory_handler, schedule_response):
@@ -129,7 +174,7 @@ async def _handle_calendar_creation(agent_calendar, memory_handler, schedule_res
         
         calendar_response = await safe_agent_run(agent_calendar, calendar_prompt)
         await cl.Message(content=str(calendar_response.output)).send()
-        memory_handler.store_bot_response(str(calendar_response.output))
+        await memory_handler.astore_bot_response(str(calendar_response.output))
     except Exception as calendar_error:
         print(f"Error creating calendar events: {calendar_error}")
         # If it's a function call error, try with a simpler approach
@@ -138,28 +183,49 @@ async def _handle_calendar_creation(agent_calendar, memory_handler, schedule_res
             try:
                 simple_response = await safe_agent_run(agent_calendar, "Please read my calendar events for the next 7 days")
                 await cl.Message(content=f"📅 Calendar status: {simple_response.output}").send()
-                memory_handler.store_bot_response(str(simple_response.output))
+                await memory_handler.astore_bot_response(str(simple_response.output))
             except Exception as simple_error:
                 error_message = f"❌ Lỗi khi tạo lịch học: {str(simple_error)}"
                 await cl.Message(content=error_message).send()
-                memory_handler.store_bot_response(error_message)
+                await memory_handler.astore_bot_response(error_message)
         else:
             error_message = f"❌ Lỗi khi tạo lịch học: {str(calendar_error)}"
             await cl.Message(content=error_message).send()
-            memory_handler.store_bot_response(error_message)
+            await memory_handler.astore_bot_response(error_message)
 
 
-async def handle_web_request(agent_knowledge_from_web, memory_handler, message_with_context):
-    """Handle web search requests"""
+async def handle_web_request(agent_knowledge_from_web, memory_handler, message_with_context,
+                             question=None, semantic_cache=None):
+    """Handle web search requests, answering repeated questions from the semantic cache"""
+    # History and student memory that precede the question; answers that depend
+    # on them are never cached or served from the cache
+    context = message_with_context
+    if question and context.endswith(f"CURRENT QUESTION: {question}"):
+        context = context[: -len(f"CURRENT QUESTION: {question}")]
     try:
+        if semantic_cache is not None and question:
+            cached_answer = await asyncio.to_thread(semantic_cache.lookup, question, context)
+            if cached_answer is not None:
+                print(f"Semantic cache hit: {semantic_cache.stats()}")
+                await cl.Message(content=cached_answer).send()
+                await memory_handler.astore_bot_response(cached_answer)
+                return
+
         response = await agent_knowledge_from_web.run((message_with_context))
         await cl.Message(content=str(response.output)).send()
-        memory_handler.store_bot_response(str(response.output))
+        await memory_handler.astore_bot_response(str(response.output))
+        if semantic_cache is not None and question:
+            try:
+                await asyncio.to_thread(semantic_cache.store, question,
+                                        str(response.output), context)
+            except Exception as cache_error:
+                # The answer already went out; caching it is best effort
+                print(f"Semantic cache store failed: {cache_error}")
     except Exception as web_error:
         print(f"Error with web search: {web_error}")
         error_message = f"❌ Lỗi khi tìm kiếm thông tin: {str(web_error)}"
         await cl.Message(content=error_message).send()
-        memory_handler.store_bot_response(error_message)
+        await memory_handler.astore_bot_response(error_message)
 
 
 async def handle_unknown_request():